@@ -1,10 +1,48 @@
+import functools
+import inspect
+
+import anyio
 from mcp.server.fastmcp import FastMCP
 
+from tools.config import warm_up
+
 # Import tool registration functions from modules
-from tools import clients, invoices, products, system, projects, tasks, payments, expenses, reports, documents
+from tools import clients, invoices, products, system, projects, tasks, payments, expenses, reports, documents, composite
+
+
+class NinjaMCP(FastMCP):
+    """
+    FastMCP server that runs blocking tool handlers in a worker thread.
+    The tools use synchronous HTTP calls; running them off the event loop
+    lets concurrent tool calls overlap instead of queueing behind each other.
+    Registering two tools under the same name raises at startup.
+    """
+
+    def tool(self, name=None, **kwargs):
+        register = super().tool(name, **kwargs)
+
+        def decorator(fn):
+            # Fail fast on duplicates - FastMCP would only log a warning and keep
+            # the first registration, leaving a dead schema in every tools/list
+            tool_name = name or fn.__name__
+            if self._tool_manager.get_tool(tool_name):
+                raise ValueError(f"Tool '{tool_name}' is registered more than once")
+
+            if inspect.iscoroutinefunction(fn):
+                return register(fn)
+
+            @functools.wraps(fn)
+            async def run_in_thread(**arguments):
+                return await anyio.to_thread.run_sync(functools.partial(fn, **arguments))
+
+            register(run_in_thread)
+            return fn
+
+        return decorator
+
 
 # Initialize the Server
-mcp = FastMCP(
+mcp = NinjaMCP(
     "InvoiceNinja-Production",
     host="0.0.0.0",
     port=8000
@@ -21,16 +59,14 @@ payments.register_tools(mcp)
 expenses.register_tools(mcp)
 reports.register_tools(mcp)
 documents.register_tools(mcp)
+composite.register_tools(mcp)
 
 
 # ============================================================
 # MCP Resources
 # ============================================================
 
-@mcp.resource("config://rate_card")
-def get_rate_card() -> str:
-    """Returns the current hourly rate card for freelance services."""
-    return """
+_RATE_CARD = """
 === RATE CARD ===
 
 Standard Hourly Rate: $50/hr
@@ -45,18 +81,19 @@ All time is tracked and billed in 15-minute increments.
 """
 
 
+@mcp.resource("config://rate_card")
+def get_rate_card() -> str:
+    """Returns the current hourly rate card for freelance services."""
+    return _RATE_CARD
+
+
 # ============================================================
 # MCP Prompts
 # ============================================================
 
-@mcp.prompt()
-def daily_briefing() -> str:
-    """
-    Morning briefing prompt - checks running timers, overdue invoices,
-    outstanding balances, unbilled hours, and tasks due soon.
-    """
-    return """
-Please give me my daily business briefing. Check and report on:
+_DAILY_BRIEFING = """
+Please give me my daily business briefing. Call the `daily_briefing_data` tool once - it
+gathers everything below in a single request - and report on:
 
 1. **Running Timers**: Are there any tasks with timers currently running? (I may have forgotten to stop them)
 
@@ -72,5 +109,15 @@ Format this as a clear morning summary I can quickly scan. Highlight anything ur
 """
 
 
+@mcp.prompt()
+def daily_briefing() -> str:
+    """
+    Morning briefing prompt - checks running timers, overdue invoices,
+    outstanding balances, unbilled hours, and tasks due soon.
+    """
+    return _DAILY_BRIEFING
+
+
 if __name__ == "__main__":
+    warm_up()
     mcp.run(transport="sse")
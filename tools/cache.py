@@ -0,0 +1,173 @@
+import threading
+import time
+from functools import partial
+
+from .config import NINJA_URL, SESSION, TIMEOUT, EXECUTOR, iter_rows, parse_json
+
+# How long (seconds) cached responses stay fresh, per endpoint
+TTL_CLIENTS = 60
+TTL_PRODUCTS = 300
+TTL_EXPENSE_CATEGORIES = 300
+TTL_DOCUMENTS = 30
+TTL_PROJECTS = 60
+TTL_INVOICES = 30
+TTL_TASKS = 30
+
+# ttl for reads that must always be current: every call goes to the API, but an
+# unchanged resource is answered with a bodiless 304 and the stored copy reused
+REVALIDATE = 0
+
+MAX_ENTRIES = 512
+
+# Client list columns the tools actually read - cached rows are trimmed to these
+CLIENT_FIELDS = ("id", "display_name", "balance", "paid_to_date")
+
+# Project list columns get_projects reads (client is the embedded include)
+PROJECT_FIELDS = ("id", "name", "client", "budgeted_hours", "current_hours", "due_date")
+
+# (path, sorted params, fields) -> (expires_at, decoded JSON body, ETag, Last-Modified)
+_cache = {}
+_lock = threading.Lock()
+
+# key -> (Future, generation when submitted) for prefetches still on the wire
+_pending = {}
+
+# Top-level path ("/tasks") -> counter bumped by invalidate(), so in-flight fetches
+# started before a write to that collection aren't cached - other collections are unaffected
+_generations = {}
+
+
+def _key(path, params, fields):
+    return (path, tuple(sorted((params or {}).items())), fields)
+
+
+def _scope(path):
+    """Top-level collection of an API path: "/tasks/abc" -> "/tasks"."""
+    return "/" + path.strip("/").split("/", 1)[0]
+
+
+def _project(body, fields):
+    """Keep only `fields` on each row of a list response so the cache holds no dead weight."""
+    rows = body.get('data')
+    if not isinstance(rows, list):
+        return body
+    return {**body, 'data': [{f: row[f] for f in fields if f in row} for row in rows]}
+
+
+def _evict(now):
+    """Make room for one entry: drop expired entries, then the oldest if still full."""
+    for key in [k for k, entry in _cache.items() if entry[0] <= now]:
+        del _cache[key]
+    while len(_cache) >= MAX_ENTRIES:
+        del _cache[next(iter(_cache))]
+
+
+def cached_get(path, params=None, ttl=TTL_DOCUMENTS, fields=None):
+    """
+    GET an API path (e.g. "/clients") and return the decoded JSON body.
+    Repeat calls with the same params within `ttl` seconds are served from memory;
+    after that the cached copy is revalidated with If-None-Match / If-Modified-Since,
+    so an unchanged resource costs a bodiless 304 instead of a full download.
+    - fields: optional tuple of keys to keep on each row of a list response
+    """
+    key = _key(path, params, fields)
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        pending = _pending.get(key)
+        generation = _generations.get(_scope(path), 0)
+
+    # A prefetch for this exact request is already on the wire - wait for it,
+    # unless a write has invalidated since it was sent (its data may predate the write)
+    if pending and pending[1] == generation:
+        try:
+            result = pending[0].result()
+        except Exception:
+            result = None
+        if result is not None:
+            with _lock:
+                if _generations.get(_scope(path), 0) == generation:
+                    return result
+
+    return _fetch(key, path, params, ttl, fields)
+
+
+def prefetch(path, params=None, ttl=TTL_DOCUMENTS, fields=None):
+    """
+    Warm the cache in the background for a request we expect next (e.g. the
+    following page of a list), so the follow-up call is answered from memory.
+    """
+    key = _key(path, params, fields)
+
+    with _lock:
+        entry = _cache.get(key)
+        if (entry and entry[0] > time.monotonic()) or key in _pending:
+            return
+        future = EXECUTOR.submit(_fetch, key, path, params, ttl, fields)
+        _pending[key] = (future, _generations.get(_scope(path), 0))
+
+    future.add_done_callback(lambda _: _forget_pending(key, future))
+
+
+def _forget_pending(key, future):
+    with _lock:
+        if _pending.get(key, (None,))[0] is future:
+            del _pending[key]
+
+
+def _fetch(key, path, params, ttl, fields):
+    """Fetch (or revalidate) one request and store the result in the cache."""
+    with _lock:
+        entry = _cache.get(key)
+        generation = _generations.get(_scope(path), 0)
+
+    headers = {}
+    if entry:
+        if entry[2]:
+            headers["If-None-Match"] = entry[2]
+        if entry[3]:
+            headers["If-Modified-Since"] = entry[3]
+
+    response = SESSION.get(f"{NINJA_URL}{path}", params=params, headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304 and entry:
+        body = entry[1]
+        etag = response.headers.get("ETag") or entry[2]
+        last_modified = response.headers.get("Last-Modified") or entry[3]
+    else:
+        response.raise_for_status()
+        body = parse_json(response)
+        if fields:
+            body = _project(body, fields)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+    now = time.monotonic()
+    with _lock:
+        # Don't cache a response that was in flight when a write invalidated it
+        if generation == _generations.get(_scope(path), 0):
+            if key not in _cache and len(_cache) >= MAX_ENTRIES:
+                _evict(now)
+            _cache[key] = (now + ttl, body, etag, last_modified)
+
+    return body
+
+
+def invalidate(path_prefix):
+    """Forget every cached response whose path starts with `path_prefix`. Call after writes."""
+    with _lock:
+        # Bump each collection the prefix can touch ("/" touches all of them)
+        for scope in {_scope(path_prefix), *_generations}:
+            if scope.startswith(path_prefix) or path_prefix.startswith(scope):
+                _generations[scope] = _generations.get(scope, 0) + 1
+        for key in [k for k in _cache if k[0].startswith(path_prefix)]:
+            del _cache[key]
+
+
+def active_clients():
+    """
+    Every active client (CLIENT_FIELDS only), walking all pages. Each page is a
+    cached_get entry, so every tool that reads the client list shares one copy.
+    """
+    return list(iter_rows("/clients", {"status": "active"}, fetch=partial(cached_get, ttl=TTL_CLIENTS, fields=CLIENT_FIELDS)))
@@ -1,26 +1,38 @@
-import requests
 from typing import Optional
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT, parse_json
+from .cache import cached_get, invalidate, prefetch, TTL_CLIENTS, CLIENT_FIELDS
 
 
 def register_tools(mcp):
     """Register all client-related tools with the MCP server."""
 
     @mcp.tool()
-    def get_clients(limit: int = 10) -> str:
-        """Fetch a list of clients with their balances."""
+    def get_clients(limit: int = 10, page: int = 1) -> str:
+        """
+        Fetch a list of clients with their balances.
+        - limit: Clients per page
+        - page: Page number (1-based) for walking longer client lists
+        """
         try:
-            url = f"{NINJA_URL}/clients?per_page={limit}&status=active"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            clients = response.json().get('data', [])
+            params = {"per_page": limit, "status": "active", "page": page}
+            body = cached_get("/clients", params, ttl=TTL_CLIENTS, fields=CLIENT_FIELDS)
+            clients = body.get('data', [])
+            total_pages = body.get('meta', {}).get('pagination', {}).get('total_pages', 1)
+
+            # Warm the next page while this one is formatted
+            if page < total_pages:
+                prefetch("/clients", {**params, "page": page + 1}, ttl=TTL_CLIENTS, fields=CLIENT_FIELDS)
 
             if not clients:
                 return "No clients found."
 
-            output = [f"--- Found {len(clients)} Clients ---"]
-            for c in clients:
-                output.append(f"- {c['display_name']} (ID: {c['id']}) | Balance: ${c['balance']}")
+            # Pre-sized list filled by index - this loop runs once per client
+            output = [None] * (len(clients) + 1)
+            output[0] = f"--- Found {len(clients)} Clients ---"
+            for i, c in enumerate(clients, 1):
+                output[i] = "- %s (ID: %s) | Balance: $%s" % (c['display_name'], c['id'], c['balance'])
+            if page < total_pages:
+                output.append(f"Page {page} of {total_pages} - call again with page={page + 1} for more")
 
             return "\n".join(output)
         except Exception as e:
@@ -30,10 +42,8 @@ def register_tools(mcp):
     def get_client_details(client_name: str) -> str:
         """Search for a specific client and return their balance and contact info."""
         try:
-            url = f"{NINJA_URL}/clients?name={client_name}&status=active"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            clients = response.json().get('data', [])
+            params = {"name": client_name, "status": "active"}
+            clients = cached_get("/clients", params, ttl=TTL_CLIENTS, fields=CLIENT_FIELDS).get('data', [])
 
             if not clients:
                 return f"No client found matching '{client_name}'."
@@ -80,9 +90,10 @@ def register_tools(mcp):
         }
 
         try:
-            response = requests.post(url, headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(url, json=payload, timeout=TIMEOUT)
             if response.status_code in [200, 201]:
-                client_id = response.json().get('data', {}).get('id')
+                invalidate("/clients")
+                client_id = parse_json(response).get('data', {}).get('id')
                 return f"Success! Created '{name}' (ID: {client_id}) with full details."
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -0,0 +1,118 @@
+import time
+from operator import itemgetter
+from .config import get_json, parallel
+from .cache import active_clients
+from .timelog import task_time
+
+
+def register_tools(mcp):
+    """Register composite tools that gather data from several endpoints in one call."""
+
+    @mcp.tool()
+    def daily_briefing_data() -> str:
+        """
+        Gather everything needed for a daily briefing in a single call:
+        running timers, overdue invoices, outstanding balances, unbilled hours,
+        and active projects with hours used vs budgeted.
+        """
+        try:
+            # Independent reads - fetch them concurrently
+            tasks, overdue, clients, projects = parallel(
+                lambda: get_json("/tasks", {"status": "active", "per_page": 100}),
+                lambda: get_json("/invoices", {"status": "active", "client_status": "overdue", "per_page": 100, "include": "client"}),
+                active_clients,
+                lambda: get_json("/projects", {"status": "active", "per_page": 50, "include": "client"}),
+            )
+            tasks = tasks.get('data', [])
+            overdue = overdue.get('data', [])
+            projects = projects.get('data', [])
+
+            now = int(time.time())
+            running = []
+            unbilled = []
+            for t in tasks:
+                hours, is_running = task_time(t, now)
+                desc = t.get('description', 'No description')[:40]
+                if is_running:
+                    running.append(f"- {desc} (ID: {t.get('id')}) | {hours:.2f}h so far")
+                if hours > 0 and not t.get('invoice_id'):
+                    unbilled.append((desc, hours, hours * float(t.get('rate', 0) or 0)))
+
+            output = ["=== DAILY BRIEFING DATA ===", "", f"RUNNING TIMERS ({len(running)})"]
+            output.extend(running or ["- None"])
+
+            output.extend(["", f"OVERDUE INVOICES ({len(overdue)})"])
+            for inv in overdue:
+                client = (inv.get('client') or {}).get('display_name', 'N/A')
+                output.append(f"- [{inv.get('number')}] {client} | ${float(inv.get('balance', 0)):,.2f} | Due: {inv.get('due_date', 'N/A')}")
+            if not overdue:
+                output.append("- None")
+
+            balances = ((c['display_name'], float(c.get('balance', 0) or 0)) for c in clients)
+            owing = sorted((row for row in balances if row[1] > 0), key=itemgetter(1), reverse=True)
+            output.extend(["", f"OUTSTANDING BALANCES (${sum(b for _, b in owing):,.2f} total)"])
+            output.extend([f"- {name}: ${balance:,.2f}" for name, balance in owing[:10]] or ["- None"])
+            if len(owing) > 10:
+                output.append(f"... and {len(owing) - 10} more clients")
+
+            output.extend([
+                "",
+                f"UNBILLED HOURS ({sum(h for _, h, _ in unbilled):.2f}h, "
+                f"${sum(b for _, _, b in unbilled):,.2f})"
+            ])
+            output.extend([f"- {desc}: {hours:.2f}h (${billable:.2f})" for desc, hours, billable in unbilled[:10]] or ["- None"])
+            if len(unbilled) > 10:
+                output.append(f"... and {len(unbilled) - 10} more tasks")
+
+            output.extend(["", f"ACTIVE PROJECTS ({len(projects)})"])
+            for p in projects:
+                client = (p.get('client') or {}).get('display_name', 'No Client')
+                budgeted = p.get('budgeted_hours', 0)
+                logged = p.get('current_hours', 0)
+                budget_str = f"{logged}/{budgeted}h" if budgeted else f"{logged}h logged"
+                output.append(f"- {p.get('name', 'Unnamed')} | {client} | Hours: {budget_str} | Due: {p.get('due_date') or 'No due date'}")
+            if not projects:
+                output.append("- None")
+
+            return "\n".join(output)
+        except Exception as e:
+            return f"Error gathering briefing data: {str(e)}"
+
+    @mcp.tool()
+    def get_recent_activity(limit: int = 10) -> str:
+        """
+        Latest invoices, expenses and payments in one call (fetched concurrently).
+        - limit: Rows to show per section
+        """
+        try:
+            invoices, expenses, payments = parallel(
+                lambda: get_json("/invoices", {"status": "active", "per_page": limit, "include": "client", "sort": "date|desc"}),
+                lambda: get_json("/expenses", {"status": "active", "per_page": limit, "include": "category", "sort": "date|desc"}),
+                lambda: get_json("/payments", {"status": "active", "per_page": limit, "include": "client", "sort": "date|desc"}),
+            )
+            invoices = invoices.get('data', [])
+            expenses = expenses.get('data', [])
+            payments = payments.get('data', [])
+
+            output = ["=== RECENT ACTIVITY ===", "", f"INVOICES ({len(invoices)})"]
+            output.extend([
+                f"- [{inv.get('number')}] {(inv.get('client') or {}).get('display_name', 'N/A')} | "
+                f"${float(inv.get('amount', 0)):,.2f} | Balance: ${float(inv.get('balance', 0)):,.2f} | {inv.get('date', 'N/A')}"
+                for inv in invoices
+            ] or ["- None"])
+
+            output.extend(["", f"EXPENSES ({len(expenses)})"])
+            output.extend([
+                f"- ${float(e.get('amount', 0)):,.2f} | {(e.get('category') or {}).get('name', 'Uncategorized')} | {e.get('date', 'N/A')}"
+                for e in expenses
+            ] or ["- None"])
+
+            output.extend(["", f"PAYMENTS ({len(payments)})"])
+            output.extend([
+                f"- ${float(p.get('amount', 0)):,.2f} from {(p.get('client') or {}).get('display_name', 'Unknown')} | {p.get('date', 'N/A')}"
+                for p in payments
+            ] or ["- None"])
+
+            return "\n".join(output)
+        except Exception as e:
+            return f"Error gathering recent activity: {str(e)}"
@@ -1,12 +1,201 @@
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, fall back to the stdlib decoder
+    orjson = None
 
 # Invoice Ninja API Configuration
 NINJA_URL = os.getenv("NINJA_URL")
 NINJA_TOKEN = os.getenv("NINJA_TOKEN")
 
+# Optional: a self-hosted aggregator that returns the whole business dashboard
+# in one response (see get_business_dashboard). Unset = five API calls.
+NINJA_DASHBOARD_URL = os.getenv("NINJA_DASHBOARD_URL")
+
 # Standard headers required by Invoice Ninja v5
 HEADERS = {
     "X-Api-Token": NINJA_TOKEN,
     "X-Requested-With": "XMLHttpRequest",
     "Content-Type": "application/json"
 }
+
+# Default (connect, read) timeout in seconds for every API call - an unreachable
+# host fails in ~3s instead of waiting out the full read timeout
+TIMEOUT = (3.05, 10)
+
+# Circuit breaker: after this many consecutive failures, fail fast for a while
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 30
+
+
+class WriteSafeRetry(Retry):
+    """
+    Retry policy that also covers writes, but only where it's safe: a 429 means
+    Invoice Ninja refused the request before doing anything, so a POST can be
+    replayed. Any other failed POST is left alone - it may already have created
+    an invoice or recorded a payment.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == "POST" and status_code == 429:
+            return super().is_retry("GET", status_code, has_retry_after)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class BreakerAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a circuit breaker. Once Invoice Ninja has failed
+    BREAKER_THRESHOLD times in a row (connection errors, timeouts or 5xx),
+    requests are refused immediately for BREAKER_COOLDOWN seconds instead of
+    each one waiting out retries and timeouts.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._breaker_lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _record(self, ok):
+        with self._breaker_lock:
+            if ok:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._failures >= BREAKER_THRESHOLD:
+                self._open_until = time.monotonic() + BREAKER_COOLDOWN
+
+    def send(self, request, *args, **kwargs):
+        remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            raise requests.ConnectionError(
+                f"Invoice Ninja is unavailable - backing off for {remaining:.0f}s before retrying"
+            )
+        try:
+            response = super().send(request, *args, **kwargs)
+        except requests.RequestException:
+            self._record(ok=False)
+            raise
+        self._record(ok=response.status_code < 500)
+        return response
+
+
+# Shared HTTP session - keeps connections to Invoice Ninja alive between tool
+# calls so only the first request pays for the TCP + TLS handshake
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+# Ask for compressed JSON - advertises br/zstd too when brotli/zstandard are installed
+# (the Docker image installs both)
+SESSION.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+# pool_block caps concurrent requests to Invoice Ninja at pool_maxsize: extra
+# tool calls wait for a free connection instead of opening throwaway ones
+_adapter = BreakerAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    pool_block=True,
+    max_retries=WriteSafeRetry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True
+    )
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# The optional dashboard aggregator gets a session of its own: it never carries
+# the Invoice Ninja API token, and its failures can't trip the breaker above
+DASHBOARD_SESSION = requests.Session()
+DASHBOARD_SESSION.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+# Worker pool for tools that fan out several independent API calls
+EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ninja-http")
+
+# Separate pool for iter_rows' page prefetch, so walking pages from inside an
+# EXECUTOR task can never wait on work queued behind itself
+_PAGER = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ninja-pages")
+
+
+def warm_up():
+    """
+    Open a pooled connection to Invoice Ninja in the background at startup, so
+    the first tool call doesn't pay for the TCP + TLS handshake.
+    """
+    def ping():
+        try:
+            SESSION.get(f"{NINJA_URL}/ping", timeout=TIMEOUT)
+        except requests.RequestException:
+            pass
+
+    EXECUTOR.submit(ping)
+
+
+def get_json(path, params=None):
+    """GET an API path (e.g. "/clients") over the shared session and return the decoded body."""
+    response = SESSION.get(f"{NINJA_URL}{path}", params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    return parse_json(response)
+
+
+def iter_rows(path, params=None, per_page=500, max_pages=20, fetch=None):
+    """
+    Yield every row of a paginated list endpoint, page by page. The next page is
+    fetched in the background while the caller works through the current one.
+    - fetch: fetch(path, params) -> decoded body, defaults to get_json
+    """
+    fetch = fetch or get_json
+    params = {**(params or {}), "per_page": per_page}
+    page = 1
+    future = _PAGER.submit(fetch, path, {**params, "page": page})
+    while future:
+        body = future.result()
+        total_pages = min(body.get('meta', {}).get('pagination', {}).get('total_pages', 1), max_pages)
+        future = _PAGER.submit(fetch, path, {**params, "page": page + 1}) if page < total_pages else None
+        yield from body.get('data', [])
+        page += 1
+
+
+def date_range(column, start="", end=""):
+    """
+    Build Invoice Ninja's `date_range` list filter ("<column>,<start>,<end>").
+    Either bound may be empty (YYYY-MM-DD); open ends are widened to cover everything.
+    """
+    return f"{column},{start or '1970-01-01'},{end or '2999-12-31'}"
+
+
+def parse_json(response):
+    """Decode a response body as JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def loads(data):
+    """Decode a JSON string or bytes (e.g. an embedded time_log), using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """Encode to a JSON string (e.g. a time_log to embed in a payload), using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def parallel(*calls):
+    """Run zero-argument callables concurrently and return their results in order."""
+    futures = [EXECUTOR.submit(call) for call in calls]
+    return [f.result() for f in futures]
@@ -1,154 +1,144 @@
-import requests
-from typing import Literal
-from .config import NINJA_URL, HEADERS
+from functools import lru_cache
+from typing import Literal, Optional
+from .cache import cached_get, TTL_DOCUMENTS
+
+# Upper bound on pages walked by a document search when the server doesn't filter
+MAX_SEARCH_PAGES = 10
+
+
+@lru_cache(maxsize=4096)
+def _humansize(n):
+    """Format a byte count as bytes/KB/MB (sizes repeat a lot across result pages)."""
+    if n >= 1048576:
+        return f"{n / 1048576:.1f} MB"
+    if n >= 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n} bytes"
+
+
+def _list_documents(entity_type, entity_id):
+    """List documents attached to an entity."""
+    # Get the entity with documents included
+    params = {"include": "documents"}
+    entity = cached_get(f"/{entity_type}/{entity_id}", params, ttl=TTL_DOCUMENTS).get('data', {})
+
+    if not entity:
+        return f"{entity_type[:-1].title()} {entity_id} not found."
+
+    documents = entity.get('documents', [])
+
+    if not documents:
+        return f"No documents attached to this {entity_type[:-1]}."
+
+    # Header is three lines, then three lines per document
+    output = [None] * (3 + 3 * len(documents))
+    output[0] = f"--- Documents for {entity_type[:-1]} {entity_id} ---"
+    output[1] = f"Total: {len(documents)} document(s)"
+    output[2] = ""
+
+    for i, doc in enumerate(documents):
+        output[3 + 3 * i:6 + 3 * i] = (
+            "- %s" % doc.get('name', 'Unnamed'),
+            "  ID: %s" % doc.get('id', 'N/A'),
+            "  Type: %s | Size: %s" % (doc.get('type', 'Unknown'), _humansize(doc.get('size') or 0)),
+        )
+
+    return "\n".join(output)
+
+
+def _document_details(document_id):
+    """Detailed information about a single document."""
+    doc = cached_get(f"/documents/{document_id}", ttl=TTL_DOCUMENTS).get('data', {})
+
+    if not doc:
+        return f"Document {document_id} not found."
+
+    name = doc.get('name', 'Unnamed')
+    doc_type = doc.get('type', 'Unknown')
+    size_str = _humansize(doc.get('size') or 0)
+    width = doc.get('width', 0)
+    height = doc.get('height', 0)
+    is_public = 'Yes' if doc.get('is_public') else 'No'
+    created_at = doc.get('created_at', 'N/A')
+
+    output = [
+        f"Document: {name}",
+        f"- ID: {document_id}",
+        f"- Type: {doc_type}",
+        f"- Size: {size_str}",
+    ]
+
+    if width and height:
+        output.append(f"- Dimensions: {width}x{height}")
+
+    output.extend([
+        f"- Public: {is_public}",
+        f"- Created: {created_at}"
+    ])
+
+    return "\n".join(output)
+
+
+def _search_documents(search_term, limit):
+    """Search documents across the system by name."""
+    # Let the server filter by name; the local name check below only matters
+    # if an instance ignores `filter`, in which case we page until we have enough
+    params = {"per_page": limit}
+    if search_term:
+        params["filter"] = search_term
+    search_lower = search_term.lower()
+
+    # Filter, size-format and render each page in a single pass
+    rows = []
+    for page in range(1, MAX_SEARCH_PAGES + 1):
+        body = cached_get("/documents", {**params, "page": page}, ttl=TTL_DOCUMENTS)
+        batch = body.get('data', [])
+        rows.extend([
+            "- %s (ID: %s) | %s | %s" % (
+                d.get('name', 'Unnamed'), d.get('id', 'N/A'),
+                d.get('type', 'Unknown'), _humansize(d.get('size') or 0)
+            )
+            for d in batch if search_lower in d.get('name', '').lower()
+        ])
+
+        total_pages = body.get('meta', {}).get('pagination', {}).get('total_pages', 1)
+        if len(rows) >= limit or not batch or page >= total_pages:
+            break
+    rows = rows[:limit]
+
+    if not rows:
+        return f"No documents matching '{search_term}'." if search_term else "No documents found."
+
+    return "\n".join([f"--- Found {len(rows)} Document(s) ---", *rows])
 
 
 def register_tools(mcp):
-    """Register all document-related tools with the MCP server (read-only)."""
+    """Register the document tool with the MCP server (read-only)."""
 
     @mcp.tool()
-    def get_documents(
-        entity_type: Literal["invoices", "expenses", "projects", "tasks", "clients"],
-        entity_id: str
+    def documents(
+        action: Literal["list", "get", "search"],
+        entity_type: Optional[Literal["invoices", "expenses", "projects", "tasks", "clients"]] = None,
+        entity_id: str = "",
+        document_id: str = "",
+        search_term: str = "",
+        limit: int = 20
     ) -> str:
         """
-        List documents attached to an entity.
-        - entity_type: Type of entity (invoices, expenses, projects, tasks, clients)
-        - entity_id: The entity's hashed ID
-        Returns list of attached documents with their details.
+        View documents (read-only).
+        - action="list": documents attached to an entity (needs entity_type and entity_id)
+        - action="get": details of one document (needs document_id)
+        - action="search": search all documents by name (optional search_term, limit)
         """
         try:
-            # Get the entity with documents included
-            url = f"{NINJA_URL}/{entity_type}/{entity_id}?include=documents"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            entity = response.json().get('data', {})
-
-            if not entity:
-                return f"{entity_type[:-1].title()} {entity_id} not found."
-
-            documents = entity.get('documents', [])
-
-            if not documents:
-                return f"No documents attached to this {entity_type[:-1]}."
-
-            output = [f"--- Documents for {entity_type[:-1]} {entity_id} ---"]
-            output.append(f"Total: {len(documents)} document(s)")
-            output.append("")
-
-            for doc in documents:
-                doc_id = doc.get('id', 'N/A')
-                name = doc.get('name', 'Unnamed')
-                doc_type = doc.get('type', 'Unknown')
-                size = doc.get('size', 0)
-
-                # Convert size to human readable
-                if size >= 1024 * 1024:
-                    size_str = f"{size / (1024 * 1024):.1f} MB"
-                elif size >= 1024:
-                    size_str = f"{size / 1024:.1f} KB"
-                else:
-                    size_str = f"{size} bytes"
-
-                output.append(f"- {name}")
-                output.append(f"  ID: {doc_id}")
-                output.append(f"  Type: {doc_type} | Size: {size_str}")
-
-            return "\n".join(output)
+            if action == "list":
+                if not entity_type or not entity_id:
+                    return "entity_type and entity_id are required to list documents."
+                return _list_documents(entity_type, entity_id)
+            if action == "get":
+                if not document_id:
+                    return "document_id is required to get a document."
+                return _document_details(document_id)
+            return _search_documents(search_term, limit)
         except Exception as e:
             return f"Error fetching documents: {str(e)}"
-
-    @mcp.tool()
-    def get_document_details(document_id: str) -> str:
-        """
-        Get detailed information about a specific document.
-        - document_id: The document's hashed ID
-        """
-        try:
-            url = f"{NINJA_URL}/documents/{document_id}"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            doc = response.json().get('data', {})
-
-            if not doc:
-                return f"Document {document_id} not found."
-
-            name = doc.get('name', 'Unnamed')
-            doc_type = doc.get('type', 'Unknown')
-            size = doc.get('size', 0)
-            width = doc.get('width', 0)
-            height = doc.get('height', 0)
-            is_public = 'Yes' if doc.get('is_public') else 'No'
-            created_at = doc.get('created_at', 'N/A')
-
-            # Convert size
-            if size >= 1024 * 1024:
-                size_str = f"{size / (1024 * 1024):.1f} MB"
-            elif size >= 1024:
-                size_str = f"{size / 1024:.1f} KB"
-            else:
-                size_str = f"{size} bytes"
-
-            output = [
-                f"Document: {name}",
-                f"- ID: {document_id}",
-                f"- Type: {doc_type}",
-                f"- Size: {size_str}",
-            ]
-
-            if width and height:
-                output.append(f"- Dimensions: {width}x{height}")
-
-            output.extend([
-                f"- Public: {is_public}",
-                f"- Created: {created_at}"
-            ])
-
-            return "\n".join(output)
-        except Exception as e:
-            return f"Error: {str(e)}"
-
-    @mcp.tool()
-    def search_documents(search_term: str = "", limit: int = 20) -> str:
-        """
-        Search all documents across the system.
-        - search_term: Optional text to search for in document names
-        - limit: Maximum number of results
-        """
-        try:
-            url = f"{NINJA_URL}/documents?per_page={limit}"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            documents = response.json().get('data', [])
-
-            if not documents:
-                return "No documents found."
-
-            # Filter by search term if provided
-            if search_term:
-                search_lower = search_term.lower()
-                documents = [d for d in documents if search_lower in d.get('name', '').lower()]
-
-            if not documents:
-                return f"No documents matching '{search_term}'."
-
-            output = [f"--- Found {len(documents)} Document(s) ---"]
-
-            for doc in documents:
-                doc_id = doc.get('id', 'N/A')
-                name = doc.get('name', 'Unnamed')
-                doc_type = doc.get('type', 'Unknown')
-                size = doc.get('size', 0)
-
-                if size >= 1024 * 1024:
-                    size_str = f"{size / (1024 * 1024):.1f} MB"
-                elif size >= 1024:
-                    size_str = f"{size / 1024:.1f} KB"
-                else:
-                    size_str = f"{size} bytes"
-
-                output.append(f"- {name} (ID: {doc_id}) | {doc_type} | {size_str}")
-
-            return "\n".join(output)
-        except Exception as e:
-            return f"Error: {str(e)}"
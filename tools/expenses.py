@@ -1,6 +1,17 @@
-import requests
+from collections import defaultdict
+from operator import itemgetter
 from typing import Optional
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT, date_range, iter_rows, parse_json
+from .cache import cached_get, TTL_EXPENSE_CATEGORIES
+
+
+def _fmt_expense(e):
+    """One list line for an expense - each nested lookup is done once."""
+    category = (e.get('category') or {}).get('name', 'Uncategorized')
+    vendor = (e.get('vendor') or {}).get('name', 'No Vendor')
+    client = (e.get('client') or {}).get('display_name', '')
+    client_str = f" | Billable to: {client}" if client else ""
+    return f"- ${float(e.get('amount', 0)):.2f} | {category} | {vendor} | {e.get('date', 'N/A')}{client_str} (ID: {e.get('id')})"
 
 
 def register_tools(mcp):
@@ -10,10 +21,7 @@ def register_tools(mcp):
     def get_expense_categories(limit: int = 50) -> str:
         """Fetch all expense categories."""
         try:
-            url = f"{NINJA_URL}/expense_categories?per_page={limit}"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            categories = response.json().get('data', [])
+            categories = cached_get("/expense_categories", {"per_page": limit}, ttl=TTL_EXPENSE_CATEGORIES).get('data', [])
 
             if not categories:
                 return "No expense categories found."
@@ -42,35 +50,24 @@ def register_tools(mcp):
         - category_id: Filter by expense category
         """
         try:
-            url = f"{NINJA_URL}/expenses?status=active&per_page={limit}&include=client,vendor,category"
+            params = {"status": "active", "per_page": limit, "include": "client,vendor,category"}
 
             if client_id:
-                url += f"&client_id={client_id}"
+                params["client_id"] = client_id
             if vendor_id:
-                url += f"&vendor_id={vendor_id}"
+                params["vendor_id"] = vendor_id
             if category_id:
-                url += f"&category_id={category_id}"
+                params["category_id"] = category_id
 
-            response = requests.get(url, headers=HEADERS)
+            response = SESSION.get(f"{NINJA_URL}/expenses", params=params, timeout=TIMEOUT)
             response.raise_for_status()
-            expenses = response.json().get('data', [])
+            expenses = parse_json(response).get('data', [])
 
             if not expenses:
                 return "No expenses found."
 
-            output = [f"--- Found {len(expenses)} Expenses ---"]
-            for e in expenses:
-                exp_id = e.get('id')
-                amount = float(e.get('amount', 0))
-                date = e.get('date', 'N/A')
-                category = e.get('category', {}).get('name', 'Uncategorized') if e.get('category') else 'Uncategorized'
-                vendor = e.get('vendor', {}).get('name', 'No Vendor') if e.get('vendor') else 'No Vendor'
-                client = e.get('client', {}).get('display_name', '') if e.get('client') else ''
-
-                client_str = f" | Billable to: {client}" if client else ""
-                output.append(f"- ${amount:.2f} | {category} | {vendor} | {date}{client_str} (ID: {exp_id})")
-
-            return "\n".join(output)
+            header = f"--- Found {len(expenses)} Expenses ---"
+            return header + "\n" + "\n".join(_fmt_expense(e) for e in expenses)
         except Exception as e:
             return f"Error fetching expenses: {str(e)}"
 
@@ -78,19 +75,19 @@ def register_tools(mcp):
     def get_expense_details(expense_id: str) -> str:
         """Get detailed information about a specific expense."""
         try:
-            url = f"{NINJA_URL}/expenses/{expense_id}?include=client,vendor,category"
-            response = requests.get(url, headers=HEADERS)
+            params = {"include": "client,vendor,category"}
+            response = SESSION.get(f"{NINJA_URL}/expenses/{expense_id}", params=params, timeout=TIMEOUT)
             response.raise_for_status()
-            e = response.json().get('data', {})
+            e = parse_json(response).get('data', {})
 
             if not e:
                 return f"Expense {expense_id} not found."
 
             amount = float(e.get('amount', 0))
             date = e.get('date', 'N/A')
-            category = e.get('category', {}).get('name', 'Uncategorized') if e.get('category') else 'Uncategorized'
-            vendor = e.get('vendor', {}).get('name', 'No Vendor') if e.get('vendor') else 'No Vendor'
-            client = e.get('client', {}).get('display_name', 'Not billable') if e.get('client') else 'Not billable'
+            category = (e.get('category') or {}).get('name', 'Uncategorized')
+            vendor = (e.get('vendor') or {}).get('name', 'No Vendor')
+            client = (e.get('client') or {}).get('display_name', 'Not billable')
             public_notes = e.get('public_notes', 'None') or 'None'
             private_notes = e.get('private_notes', 'None') or 'None'
             is_billable = 'Yes' if e.get('should_be_invoiced') else 'No'
@@ -151,10 +148,10 @@ def register_tools(mcp):
             if private_notes:
                 payload["private_notes"] = private_notes
 
-            response = requests.post(f"{NINJA_URL}/expenses", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(f"{NINJA_URL}/expenses", json=payload, timeout=TIMEOUT)
 
             if response.status_code in [200, 201]:
-                exp = response.json().get('data', {})
+                exp = parse_json(response).get('data', {})
                 return f"Success! Created expense of ${amount:.2f} (ID: {exp.get('id')}) on {date}."
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -172,57 +169,43 @@ def register_tools(mcp):
         - end_date: Filter to date (YYYY-MM-DD)
         """
         try:
-            url = f"{NINJA_URL}/expenses?status=active&per_page=500&include=category"
-
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            expenses = response.json().get('data', [])
-
-            if not expenses:
-                return "No expenses found."
+            params = {"status": "active", "include": "category"}
+            # Let the API do the date filtering so out-of-range rows never cross the wire
+            if start_date or end_date:
+                params["date_range"] = date_range("date", start_date, end_date)
 
-            # Filter by date if provided
-            filtered = []
-            for e in expenses:
-                exp_date = e.get('date', '')
-                if start_date and exp_date < start_date:
-                    continue
-                if end_date and exp_date > end_date:
-                    continue
-                filtered.append(e)
-
-            if not filtered:
-                return "No expenses found in the specified date range."
-
-            # Group by category
-            by_category = {}
+            # Group by category as each page arrives - only one page is held at a time
+            by_category = defaultdict(float)
             total = 0
+            count = 0
 
-            for e in filtered:
-                category = e.get('category', {}).get('name', 'Uncategorized') if e.get('category') else 'Uncategorized'
+            for e in iter_rows("/expenses", params):
+                category = (e.get('category') or {}).get('name', 'Uncategorized')
                 amount = float(e.get('amount', 0))
-
-                if category not in by_category:
-                    by_category[category] = 0
                 by_category[category] += amount
                 total += amount
+                count += 1
+
+            if not count:
+                if start_date or end_date:
+                    return "No expenses found in the specified date range."
+                return "No expenses found."
 
             # Sort by amount descending
-            sorted_cats = sorted(by_category.items(), key=lambda x: x[1], reverse=True)
+            sorted_cats = sorted(by_category.items(), key=itemgetter(1), reverse=True)
 
             output = [f"--- Expense Summary ---"]
             if start_date or end_date:
-                date_range = f"{start_date or 'beginning'} to {end_date or 'now'}"
-                output.append(f"Date Range: {date_range}")
+                output.append(f"Date Range: {start_date or 'beginning'} to {end_date or 'now'}")
 
             output.append(f"Total Expenses: ${total:,.2f}")
-            output.append(f"Number of Expenses: {len(filtered)}")
+            output.append(f"Number of Expenses: {count}")
             output.append("")
             output.append("By Category:")
 
-            for cat, amt in sorted_cats:
-                percent = (amt / total * 100) if total > 0 else 0
-                output.append(f"- {cat}: ${amt:,.2f} ({percent:.1f}%)")
+            # Percent scale is the same for every row - work it out once
+            scale = 100.0 / total if total > 0 else 0.0
+            output.extend([f"- {cat}: ${amt:,.2f} ({amt * scale:.1f}%)" for cat, amt in sorted_cats])
 
             return "\n".join(output)
         except Exception as e:
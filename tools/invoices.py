@@ -1,6 +1,7 @@
-import requests
+from functools import partial
 from typing import Literal
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT, date_range, parallel, parse_json
+from .cache import cached_get, invalidate, prefetch, TTL_INVOICES
 
 
 def register_tools(mcp):
@@ -10,37 +11,57 @@ def register_tools(mcp):
     def get_invoices(
         client_status: Literal["paid", "unpaid", "overdue", "all"] = "all",
         include_archived: bool = False,
-        limit: int = 10
+        limit: int = 10,
+        since: str = "",
+        until: str = "",
+        page: int = 1
     ) -> str:
         """
-        Fetch invoices filtered by payment status.
+        Fetch invoices filtered by payment status, sorted by due date.
         - client_status: Filter by payment state (paid/unpaid/overdue/all)
         - include_archived: If True, includes archived/deleted invoices (default: False, only active)
         - limit: Number of invoices to return
+        - since / until: Only invoices due within this range (YYYY-MM-DD, either optional)
+        - page: Page number (1-based) for walking longer invoice lists
+        Unpaid/overdue invoices are listed soonest-due first; otherwise most recent first.
         """
         try:
             entity_status = "active" if not include_archived else "active,archived,deleted"
-            base_url = f"{NINJA_URL}/invoices?status={entity_status}&per_page={limit}&include=client"
+            direction = "asc" if client_status in ("unpaid", "overdue") else "desc"
+            params = {
+                "status": entity_status,
+                "per_page": limit,
+                "include": "client",
+                "sort": f"due_date|{direction}",
+                "page": page
+            }
 
             if client_status != "all":
-                base_url += f"&client_status={client_status}"
+                params["client_status"] = client_status
+            if since or until:
+                params["date_range"] = date_range("due_date", since, until)
 
-            response = requests.get(base_url, headers=HEADERS)
-            response.raise_for_status()
-            invoices = response.json().get('data', [])
+            body = cached_get("/invoices", params, ttl=TTL_INVOICES)
+            invoices = body.get('data', [])
+            total_pages = body.get('meta', {}).get('pagination', {}).get('total_pages', 1)
 
             if not invoices:
                 return f"No {client_status} invoices found."
 
-            output = [f"--- Found {len(invoices)} {client_status} invoices ---"]
-            for inv in invoices:
-                client = inv.get('client', {}).get('display_name', 'N/A')
-                num = inv.get('number')
-                inv_id = inv.get('id')
+            # Warm the next page while this one is formatted
+            if page < total_pages:
+                prefetch("/invoices", {**params, "page": page + 1}, ttl=TTL_INVOICES)
+
+            output = [None] * (len(invoices) + 1)
+            output[0] = f"--- Found {len(invoices)} {client_status} invoices ---"
+            for i, inv in enumerate(invoices, 1):
+                client = (inv.get('client') or {}).get('display_name', 'N/A')
                 due_date = inv.get('due_date', 'No Due Date')
                 balance = inv.get('balance', 0.0)
-                status_tag = "PAID" if float(balance) <= 0 else f"Pending: ${balance}"
-                output.append(f"[{num}] (ID: {inv_id}) {client} | {status_tag} | Due: {due_date}")
+                status_tag = "PAID" if float(balance) <= 0 else "Pending: $%s" % balance
+                output[i] = "[%s] (ID: %s) %s | %s | Due: %s" % (inv.get('number'), inv.get('id'), client, status_tag, due_date)
+            if page < total_pages:
+                output.append(f"Page {page} of {total_pages} - call again with page={page + 1} for more")
 
             return "\n".join(output)
         except Exception as e:
@@ -50,16 +71,14 @@ def register_tools(mcp):
     def get_invoice_summary(invoice_number: str) -> str:
         """Returns the details and payment status for a specific invoice number."""
         try:
-            url = f"{NINJA_URL}/invoices?number={invoice_number}&include=client"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            data = response.json().get('data', [])
+            params = {"number": invoice_number, "include": "client"}
+            data = cached_get("/invoices", params, ttl=TTL_INVOICES).get('data', [])
 
             if not data:
                 return f"Invoice #{invoice_number} not found."
 
             inv = data[0]
-            client = inv.get('client', {}).get('display_name', 'N/A')
+            client = (inv.get('client') or {}).get('display_name', 'N/A')
             amount = inv.get('amount', 0.0)
             balance = inv.get('balance', 0.0)
             status = "PAID" if float(balance) <= 0 else "UNPAID"
@@ -91,35 +110,85 @@ def register_tools(mcp):
         try:
             payload = {
                 "client_id": client_id,
-                "line_items": line_items,
-                "due_date": due_date
+                "line_items": line_items
             }
-            if not due_date:
-                payload.pop("due_date")
+            if due_date:
+                payload["due_date"] = due_date
 
-            response = requests.post(f"{NINJA_URL}/invoices", headers=HEADERS, json=payload)
+            response = SESSION.post(f"{NINJA_URL}/invoices", json=payload, timeout=TIMEOUT)
             response.raise_for_status()
-            inv = response.json().get('data', {})
+            invalidate("/invoices")
+            inv = parse_json(response).get('data', {})
             return f"Successfully created Invoice #{inv.get('number')} (ID: {inv.get('id')}) for total ${inv.get('amount')}. Due: {inv.get('due_date')}"
         except Exception as e:
             return f"Failed to create invoice: {str(e)}"
 
     @mcp.tool()
-    def send_reminder(invoice_id: str) -> str:
-        """Send an invoice email to the client using the official bulk action route."""
+    def create_invoices_bulk(invoices: list[dict]) -> str:
+        """
+        Create several draft invoices in one call (requests are sent concurrently).
+        invoices should be a list of dicts shaped like create_invoice's arguments:
+        [{"client_id": "abc123", "line_items": [{"product_key": "Service", "cost": 50, "qty": 1}], "due_date": "YYYY-MM-DD"}]
+        """
+        def create(invoice):
+            payload = {k: v for k, v in invoice.items() if v or k != "due_date"}
+            try:
+                response = SESSION.post(f"{NINJA_URL}/invoices", json=payload, timeout=TIMEOUT)
+                response.raise_for_status()
+                inv = parse_json(response).get('data', {})
+                return True, f"- Invoice #{inv.get('number')} (ID: {inv.get('id')}) for client {invoice.get('client_id')}: ${inv.get('amount')}"
+            except Exception as e:
+                return False, f"- Client {invoice.get('client_id')}: {str(e)}"
+
+        if not invoices:
+            return "No invoices provided."
+
+        results = parallel(*(partial(create, inv) for inv in invoices))
+        invalidate("/invoices")
+        created = [line for ok, line in results if ok]
+        failed = [line for ok, line in results if not ok]
+
+        output = [f"Created {len(created)}/{len(invoices)} invoices."]
+        output.extend(created)
+        if failed:
+            output.append("Failed:")
+            output.extend(failed)
+        return "\n".join(output)
+
+    @mcp.tool()
+    def send_reminder(
+        invoice_ids: list[str] | str,
+        email_type: Literal["reminder1", "reminder2", "reminder3"] = "reminder1"
+    ) -> str:
+        """
+        Email one or more invoices to their clients in a single bulk action request.
+        - invoice_ids: List of invoice IDs to send (a single ID string also works)
+        - email_type: Reminder template to use (reminder1/reminder2/reminder3)
+        """
+        if isinstance(invoice_ids, str):
+            invoice_ids = [invoice_ids]
+
         url = f"{NINJA_URL}/invoices/bulk"
 
         payload = {
-            "email_type": "reminder1",
+            "email_type": email_type,
             "action": "send_email",
-            "ids": [invoice_id]
+            "ids": invoice_ids
         }
 
         try:
-            response = requests.post(url, headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(url, json=payload, timeout=TIMEOUT)
 
             if response.status_code == 200:
-                return f"Successfully queued invoice {invoice_id} for emailing."
+                invalidate("/invoices")
+                # The bulk route echoes back the invoices it acted on
+                data = parse_json(response).get('data', [])
+                sent = {inv.get('id') for inv in data} if isinstance(data, list) else set()
+                lines = [
+                    f"- {inv_id}: {'queued' if not sent or inv_id in sent else 'not found'}"
+                    for inv_id in invoice_ids
+                ]
+                return f"Sent {email_type} for {len(invoice_ids)} invoice(s):\n" + "\n".join(lines)
             else:
                 return f"Failed to send email: {response.status_code} - {response.text}"
 
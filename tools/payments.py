@@ -1,6 +1,14 @@
-import requests
+from functools import partial
 from typing import Literal, Optional
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT, parallel, parse_json
+from .cache import invalidate
+
+
+def _fmt_payment(p):
+    """One list line for a payment - each nested lookup is done once."""
+    client = (p.get('client') or {}).get('display_name', 'Unknown')
+    invoice_nums = ', '.join([inv.get('number', 'N/A') for inv in (p.get('invoices') or [])[:3]]) or 'N/A'
+    return f"- ${float(p.get('amount', 0)):.2f} from {client} (ID: {p.get('id')}) | Date: {p.get('date', 'N/A')} | Invoices: {invoice_nums}"
 
 
 def register_tools(mcp):
@@ -18,35 +26,20 @@ def register_tools(mcp):
         - status: Filter by payment status
         """
         try:
-            url = f"{NINJA_URL}/payments?status=active&per_page={limit}&include=client,invoices"
+            params = {"status": "active", "per_page": limit, "include": "client,invoices"}
 
             if client_id:
-                url += f"&client_id={client_id}"
+                params["client_id"] = client_id
 
-            response = requests.get(url, headers=HEADERS)
+            response = SESSION.get(f"{NINJA_URL}/payments", params=params, timeout=TIMEOUT)
             response.raise_for_status()
-            payments = response.json().get('data', [])
+            payments = parse_json(response).get('data', [])
 
             if not payments:
                 return "No payments found."
 
-            output = [f"--- Found {len(payments)} Payments ---"]
-            for p in payments:
-                pay_id = p.get('id')
-                amount = float(p.get('amount', 0))
-                date = p.get('date', 'N/A')
-                client = p.get('client', {}).get('display_name', 'Unknown') if p.get('client') else 'Unknown'
-                payment_type = p.get('type', {}).get('name', 'Unknown') if p.get('type') else 'Unknown'
-
-                # Get invoice numbers if available
-                invoices = p.get('invoices', [])
-                invoice_nums = ', '.join([inv.get('number', 'N/A') for inv in invoices[:3]])
-                if not invoice_nums:
-                    invoice_nums = 'N/A'
-
-                output.append(f"- ${amount:.2f} from {client} (ID: {pay_id}) | Date: {date} | Invoices: {invoice_nums}")
-
-            return "\n".join(output)
+            header = f"--- Found {len(payments)} Payments ---"
+            return header + "\n" + "\n".join(_fmt_payment(p) for p in payments)
         except Exception as e:
             return f"Error fetching payments: {str(e)}"
 
@@ -54,17 +47,17 @@ def register_tools(mcp):
     def get_payment_details(payment_id: str) -> str:
         """Get detailed information about a specific payment."""
         try:
-            url = f"{NINJA_URL}/payments/{payment_id}?include=client,invoices"
-            response = requests.get(url, headers=HEADERS)
+            params = {"include": "client,invoices"}
+            response = SESSION.get(f"{NINJA_URL}/payments/{payment_id}", params=params, timeout=TIMEOUT)
             response.raise_for_status()
-            p = response.json().get('data', {})
+            p = parse_json(response).get('data', {})
 
             if not p:
                 return f"Payment {payment_id} not found."
 
             amount = float(p.get('amount', 0))
             date = p.get('date', 'N/A')
-            client = p.get('client', {}).get('display_name', 'Unknown') if p.get('client') else 'Unknown'
+            client = (p.get('client') or {}).get('display_name', 'Unknown')
             transaction_ref = p.get('transaction_reference', 'None')
             private_notes = p.get('private_notes', 'None') or 'None'
 
@@ -129,10 +122,13 @@ def register_tools(mcp):
             if notes:
                 payload["private_notes"] = notes
 
-            response = requests.post(f"{NINJA_URL}/payments", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(f"{NINJA_URL}/payments", json=payload, timeout=TIMEOUT)
 
             if response.status_code in [200, 201]:
-                pay = response.json().get('data', {})
+                # Payments move invoice and client balances
+                invalidate("/invoices")
+                invalidate("/clients")
+                pay = parse_json(response).get('data', {})
                 return f"Success! Recorded payment of ${amount:.2f} (ID: {pay.get('id')}) from client {client_id}."
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -152,9 +148,9 @@ def register_tools(mcp):
         """
         try:
             # First get the invoice to find the client
-            inv_response = requests.get(f"{NINJA_URL}/invoices/{invoice_id}", headers=HEADERS)
+            inv_response = SESSION.get(f"{NINJA_URL}/invoices/{invoice_id}", timeout=TIMEOUT)
             inv_response.raise_for_status()
-            invoice = inv_response.json().get('data', {})
+            invoice = parse_json(inv_response).get('data', {})
 
             if not invoice:
                 return f"Invoice {invoice_id} not found."
@@ -176,13 +172,107 @@ def register_tools(mcp):
             if notes:
                 payload["private_notes"] = notes
 
-            response = requests.post(f"{NINJA_URL}/payments", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(f"{NINJA_URL}/payments", json=payload, timeout=TIMEOUT)
 
             if response.status_code in [200, 201]:
-                pay = response.json().get('data', {})
+                invalidate("/invoices")
+                invalidate("/clients")
+                pay = parse_json(response).get('data', {})
                 new_balance = invoice_balance - amount
                 return f"Success! Applied ${amount:.2f} to invoice {invoice_id}. New balance: ${new_balance:.2f}"
             else:
                 return f"Failed: {response.status_code} - {response.text}"
         except Exception as e:
             return f"Request failed: {str(e)}"
+
+    @mcp.tool()
+    def apply_payments_to_invoices(payments: list[dict]) -> str:
+        """
+        Record payments against several invoices in one call.
+        payments should be a list of dicts: [{"invoice_id": "abc123", "amount": 50, "date": "YYYY-MM-DD", "notes": "..."}]
+        (date and notes are optional). All invoices are looked up concurrently,
+        then all payments are posted concurrently.
+        """
+        def fetch_invoice(invoice_id):
+            """Return (invoice, error) - error is None on success."""
+            try:
+                response = SESSION.get(f"{NINJA_URL}/invoices/{invoice_id}", timeout=TIMEOUT)
+                if response.status_code == 404:
+                    return {}, "invoice not found"
+                response.raise_for_status()
+                invoice = parse_json(response).get('data', {})
+                return invoice, None if invoice else "invoice not found"
+            except Exception as e:
+                return {}, str(e)
+
+        def post_payment(item, amount, invoice, new_balance):
+            invoice_id = item.get('invoice_id')
+            payload = {
+                "client_id": invoice.get('client_id'),
+                "amount": amount,
+                "invoices": [{"invoice_id": invoice_id, "amount": amount}]
+            }
+            if item.get('date'):
+                payload["date"] = item['date']
+            if item.get('notes'):
+                payload["private_notes"] = item['notes']
+
+            try:
+                response = SESSION.post(f"{NINJA_URL}/payments", json=payload, timeout=TIMEOUT)
+                if response.status_code in [200, 201]:
+                    return True, f"- {invoice_id}: applied ${amount:.2f}, new balance ${new_balance:.2f}"
+                return False, f"- {invoice_id}: {response.status_code} - {response.text}"
+            except Exception as e:
+                return False, f"- {invoice_id}: {str(e)}"
+
+        if not payments:
+            return "No payments provided."
+
+        # Check every entry before any request goes out
+        valid = []
+        failed = []
+        for item in payments:
+            if not isinstance(item, dict):
+                failed.append(f"- {item!r}: not a payment object")
+                continue
+            try:
+                amount = float(item.get('amount', 0))
+            except (TypeError, ValueError):
+                failed.append(f"- {item.get('invoice_id')}: invalid amount {item.get('amount')!r}")
+                continue
+            valid.append((item, amount))
+
+        # Wave 1: look up each distinct invoice's client and balance once
+        invoice_ids = list(dict.fromkeys(item.get('invoice_id') for item, _ in valid))
+        lookups = dict(zip(invoice_ids, parallel(*(partial(fetch_invoice, i) for i in invoice_ids))))
+
+        # Entries for the same invoice draw down one running balance, so together they can't overpay it
+        remaining = {}
+        to_post = []
+        for item, amount in valid:
+            invoice_id = item.get('invoice_id')
+            invoice, error = lookups[invoice_id]
+            if error:
+                failed.append(f"- {invoice_id}: {error}")
+                continue
+            balance = remaining.get(invoice_id, float(invoice.get('balance', 0)))
+            if amount > balance:
+                failed.append(f"- {invoice_id}: ${amount:.2f} exceeds balance ${balance:.2f}")
+            else:
+                remaining[invoice_id] = balance - amount
+                to_post.append(partial(post_payment, item, amount, invoice, balance - amount))
+
+        # Wave 2: post all the payments
+        results = parallel(*to_post)
+        applied = [line for ok, line in results if ok]
+        failed.extend(line for ok, line in results if not ok)
+        if applied:
+            invalidate("/invoices")
+            invalidate("/clients")
+
+        output = [f"Applied {len(applied)}/{len(payments)} payments."]
+        output.extend(applied)
+        if failed:
+            output.append("Failed:")
+            output.extend(failed)
+        return "\n".join(output)
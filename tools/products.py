@@ -1,5 +1,4 @@
-import requests
-from .config import NINJA_URL, HEADERS
+from .cache import cached_get, TTL_PRODUCTS
 
 
 def register_tools(mcp):
@@ -9,9 +8,8 @@ def register_tools(mcp):
     def get_products(limit: int = 50) -> str:
         """Fetch and list all products/services available in Invoice Ninja."""
         try:
-            response = requests.get(f"{NINJA_URL}/products?per_page={limit}", headers=HEADERS)
-            response.raise_for_status()
-            products = response.json().get('data', [])
+            params = {"per_page": limit}
+            products = cached_get("/products", params, ttl=TTL_PRODUCTS).get('data', [])
 
             if not products:
                 return "No products/services found."
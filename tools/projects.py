@@ -1,6 +1,12 @@
-import requests
+import time
 from typing import Optional
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT, get_json, parallel, parse_json
+from .cache import cached_get, invalidate, REVALIDATE, TTL_PROJECTS, PROJECT_FIELDS
+from .timelog import task_time
+
+
+def _budget_str(logged, budgeted):
+    return f"{logged}/{budgeted}h" if budgeted else f"{logged}h logged"
 
 
 def register_tools(mcp):
@@ -21,28 +27,23 @@ def register_tools(mcp):
         """
         try:
             entity_status = "active" if not include_archived else "active,archived,deleted"
-            url = f"{NINJA_URL}/projects?status={entity_status}&per_page={limit}&include=client"
+            params = {"status": entity_status, "per_page": limit, "include": "client"}
             if client_id:
-                url += f"&client_id={client_id}"
+                params["client_id"] = client_id
 
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            projects = response.json().get('data', [])
+            projects = cached_get("/projects", params, ttl=TTL_PROJECTS, fields=PROJECT_FIELDS).get('data', [])
 
             if not projects:
                 return "No projects found."
 
             output = [f"--- Found {len(projects)} Projects ---"]
-            for p in projects:
-                name = p.get('name', 'Unnamed')
-                proj_id = p.get('id')
-                client = p.get('client', {}).get('display_name', 'No Client')
-                budgeted = p.get('budgeted_hours', 0)
-                logged = p.get('current_hours', 0)
-                due_date = p.get('due_date', 'No due date')
-
-                budget_str = f"{logged}/{budgeted}h" if budgeted else f"{logged}h logged"
-                output.append(f"- {name} (ID: {proj_id}) | Client: {client} | Hours: {budget_str} | Due: {due_date}")
+            output.extend([
+                f"- {p.get('name', 'Unnamed')} (ID: {p.get('id')}) | "
+                f"Client: {(p.get('client') or {}).get('display_name', 'No Client')} | "
+                f"Hours: {_budget_str(p.get('current_hours', 0), p.get('budgeted_hours', 0))} | "
+                f"Due: {p.get('due_date', 'No due date')}"
+                for p in projects
+            ])
 
             return "\n".join(output)
         except Exception as e:
@@ -52,16 +53,13 @@ def register_tools(mcp):
     def get_project_details(project_id: str) -> str:
         """Get detailed information about a specific project including tasks and budget status."""
         try:
-            url = f"{NINJA_URL}/projects/{project_id}?include=client"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            p = response.json().get('data', {})
+            p = cached_get(f"/projects/{project_id}", {"include": "client"}, ttl=REVALIDATE).get('data', {})
 
             if not p:
                 return f"Project {project_id} not found."
 
             name = p.get('name', 'Unnamed')
-            client = p.get('client', {}).get('display_name', 'No Client')
+            client = (p.get('client') or {}).get('display_name', 'No Client')
             budgeted = float(p.get('budgeted_hours', 0))
             logged = float(p.get('current_hours', 0))
             due_date = p.get('due_date', 'No due date')
@@ -116,10 +114,11 @@ def register_tools(mcp):
             if due_date:
                 payload["due_date"] = due_date
 
-            response = requests.post(f"{NINJA_URL}/projects", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(f"{NINJA_URL}/projects", json=payload, timeout=TIMEOUT)
 
             if response.status_code in [200, 201]:
-                proj = response.json().get('data', {})
+                invalidate("/projects")
+                proj = parse_json(response).get('data', {})
                 return f"Success! Created project '{name}' (ID: {proj.get('id')}) for client {client_id}."
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -153,9 +152,10 @@ def register_tools(mcp):
             if not payload:
                 return "No fields provided to update."
 
-            response = requests.put(f"{NINJA_URL}/projects/{project_id}", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.put(f"{NINJA_URL}/projects/{project_id}", json=payload, timeout=TIMEOUT)
 
             if response.status_code == 200:
+                invalidate("/projects")
                 return f"Successfully updated project {project_id}."
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -171,62 +171,37 @@ def register_tools(mcp):
         - Billable amount calculation
         """
         try:
-            import json
-
-            # Get project details
-            proj_resp = requests.get(f"{NINJA_URL}/projects/{project_id}?include=client", headers=HEADERS)
-            proj_resp.raise_for_status()
-            p = proj_resp.json().get('data', {})
+            # Project and its tasks are independent reads - fetch them together
+            p, tasks = parallel(
+                lambda: cached_get(f"/projects/{project_id}", {"include": "client"}, ttl=REVALIDATE).get('data', {}),
+                lambda: get_json("/tasks", {"project_id": project_id, "status": "active", "per_page": 100}).get('data', []),
+            )
 
             if not p:
                 return f"Project {project_id} not found."
 
             name = p.get('name', 'Unnamed')
-            client = p.get('client', {}).get('display_name', 'No Client')
+            client = (p.get('client') or {}).get('display_name', 'No Client')
             budgeted = float(p.get('budgeted_hours', 0))
             task_rate = float(p.get('task_rate', 0))
 
-            # Get tasks for this project
-            tasks_resp = requests.get(f"{NINJA_URL}/tasks?project_id={project_id}&status=active&per_page=100", headers=HEADERS)
-            tasks_resp.raise_for_status()
-            tasks = tasks_resp.json().get('data', [])
-
             # Calculate hours per task
             total_hours = 0
             task_breakdown = []
             running_tasks = 0
+            now = int(time.time())
 
             for t in tasks:
                 desc = t.get('description', 'No description')[:40]
-                task_id = t.get('id')
-                time_log = t.get('time_log', '[]')
                 rate = float(t.get('rate', 0)) or task_rate
 
-                try:
-                    logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-                    task_seconds = 0
-                    is_running = False
-
-                    for log in logs:
-                        start = log[0] if len(log) > 0 else 0
-                        end = log[1] if len(log) > 1 and log[1] else 0
-                        if end == 0 and start > 0:
-                            is_running = True
-                            import time
-                            end = int(time.time())
-                        if start and end:
-                            task_seconds += (end - start)
-
-                    task_hours = task_seconds / 3600
-                    total_hours += task_hours
-
-                    if is_running:
-                        running_tasks += 1
-
-                    status = " [RUNNING]" if is_running else ""
-                    task_breakdown.append(f"  - {desc}{status}: {task_hours:.2f}h (${task_hours * rate:.2f})")
-                except:
-                    task_breakdown.append(f"  - {desc}: 0h")
+                task_hours, is_running = task_time(t, now)
+                total_hours += task_hours
+                if is_running:
+                    running_tasks += 1
+
+                status = " [RUNNING]" if is_running else ""
+                task_breakdown.append(f"  - {desc}{status}: {task_hours:.2f}h (${task_hours * rate:.2f})")
 
             # Calculate totals
             total_billable = total_hours * task_rate
@@ -1,5 +1,69 @@
-import requests
-from .config import NINJA_URL, HEADERS
+from collections import defaultdict
+from datetime import date
+from operator import itemgetter
+from functools import partial
+from .config import DASHBOARD_SESSION, NINJA_DASHBOARD_URL, TIMEOUT, date_range, get_json, iter_rows, parallel, parse_json
+from .cache import active_clients, cached_get, REVALIDATE
+from .timelog import is_running
+
+
+def _expense_total():
+    """Sum every active expense, walking all pages - each page is revalidated, not re-downloaded."""
+    # Only the amount is cached per row - the pagination meta is kept, so paging still works
+    fetch = partial(cached_get, ttl=REVALIDATE, fields=("amount",))
+    rows = iter_rows("/expenses", {"status": "active"}, fetch=fetch)
+    return sum(float(e.get('amount', 0)) for e in rows)
+
+
+def _payments(start_date="", end_date=""):
+    """
+    Yield every active payment (with its client) in the date range, walking all pages.
+    The API filters by date_range; the date check here only guards servers that ignore it.
+    """
+    params = {"status": "active", "include": "client"}
+    if start_date or end_date:
+        params["date_range"] = date_range("date", start_date, end_date)
+    rows = iter_rows("/payments", params, fetch=partial(cached_get, ttl=REVALIDATE))
+
+    if not (start_date or end_date):
+        # No range asked for - nothing to guard
+        yield from rows
+        return
+
+    # Open ends are resolved once here, so each row is a single chained compare
+    # (YYYY-MM-DD strings order the same as the dates they spell)
+    lo, hi = start_date, end_date or "9999-12-31"
+    for p in rows:
+        if lo <= p.get('date', '') <= hi:
+            yield p
+
+
+def _dashboard_data():
+    """
+    Return (clients, overdue_invoices, total_expenses, projects, tasks) for the dashboard.
+    With NINJA_DASHBOARD_URL set this is one request to an aggregator that answers with
+    {"clients": [...], "overdue_invoices": [...], "expenses": [...], "projects": [...], "tasks": [...]}
+    (same row shapes as the Invoice Ninja list endpoints); otherwise five concurrent API calls.
+    """
+    if NINJA_DASHBOARD_URL:
+        response = DASHBOARD_SESSION.get(NINJA_DASHBOARD_URL, timeout=TIMEOUT)
+        response.raise_for_status()
+        body = parse_json(response)
+        return (
+            body.get('clients', []),
+            body.get('overdue_invoices', []),
+            sum(float(e.get('amount', 0)) for e in body.get('expenses', [])),
+            body.get('projects', []),
+            body.get('tasks', []),
+        )
+
+    return parallel(
+        active_clients,
+        lambda: get_json("/invoices", {"status": "active", "client_status": "overdue", "per_page": 100}).get('data', []),
+        _expense_total,
+        lambda: get_json("/projects", {"status": "active"}).get('data', []),
+        lambda: get_json("/tasks", {"status": "active"}).get('data', []),
+    )
 
 
 def register_tools(mcp):
@@ -12,19 +76,20 @@ def register_tools(mcp):
         Shows who owes you money, ranked by amount.
         """
         try:
-            response = requests.get(f"{NINJA_URL}/clients?status=active&per_page=100", headers=HEADERS)
-            response.raise_for_status()
-            clients = response.json().get('data', [])
+            clients = active_clients()
 
-            # Filter to clients with outstanding balance
-            with_balance = [(c['display_name'], c['id'], float(c.get('balance', 0)))
-                           for c in clients if float(c.get('balance', 0)) > 0]
+            # Filter to clients with outstanding balance - convert each balance once
+            with_balance = []
+            for c in clients:
+                balance = float(c.get('balance', 0) or 0)
+                if balance > 0:
+                    with_balance.append((c['display_name'], c['id'], balance))
 
             if not with_balance:
                 return "No outstanding balances found."
 
             # Sort by balance descending
-            with_balance.sort(key=lambda x: x[2], reverse=True)
+            with_balance.sort(key=itemgetter(2), reverse=True)
 
             total_outstanding = sum(b[2] for b in with_balance)
 
@@ -35,9 +100,8 @@ def register_tools(mcp):
                 ""
             ]
 
-            for name, client_id, balance in with_balance:
-                percent = (balance / total_outstanding * 100) if total_outstanding > 0 else 0
-                output.append(f"- {name}: ${balance:,.2f} ({percent:.1f}%)")
+            scale = 100.0 / total_outstanding if total_outstanding > 0 else 0.0
+            output.extend([f"- {name}: ${balance:,.2f} ({balance * scale:.1f}%)" for name, _, balance in with_balance])
 
             return "\n".join(output)
         except Exception as e:
@@ -50,25 +114,17 @@ def register_tools(mcp):
         Shows invoices grouped by how long they've been overdue (30/60/90+ days).
         """
         try:
-            from datetime import datetime, timedelta
-
-            url = f"{NINJA_URL}/invoices?status=active&client_status=overdue&per_page=100&include=client"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            invoices = response.json().get('data', [])
+            params = {"status": "active", "client_status": "overdue", "per_page": 100, "include": "client"}
+            invoices = cached_get("/invoices", params, ttl=REVALIDATE).get('data', [])
 
             if not invoices:
                 return "No overdue invoices found."
 
-            today = datetime.now().date()
+            today = date.today()
 
-            # Categorize by aging
-            buckets = {
-                '1-30 days': [],
-                '31-60 days': [],
-                '61-90 days': [],
-                '90+ days': []
-            }
+            # Categorize by aging - bucket i covers days 30*i+1 .. 30*(i+1), the last is open-ended
+            bucket_names = ('1-30 days', '31-60 days', '61-90 days', '90+ days')
+            bucket_lists = ([], [], [], [])
 
             for inv in invoices:
                 due_date_str = inv.get('due_date', '')
@@ -76,14 +132,14 @@ def register_tools(mcp):
                     continue
 
                 try:
-                    due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+                    due_date = date.fromisoformat(due_date_str)
                     days_overdue = (today - due_date).days
 
                     if days_overdue <= 0:
                         continue  # Not actually overdue
 
                     balance = float(inv.get('balance', 0))
-                    client = inv.get('client', {}).get('display_name', 'Unknown') if inv.get('client') else 'Unknown'
+                    client = (inv.get('client') or {}).get('display_name', 'Unknown')
                     number = inv.get('number', 'N/A')
 
                     entry = {
@@ -93,19 +149,12 @@ def register_tools(mcp):
                         'days': days_overdue
                     }
 
-                    if days_overdue <= 30:
-                        buckets['1-30 days'].append(entry)
-                    elif days_overdue <= 60:
-                        buckets['31-60 days'].append(entry)
-                    elif days_overdue <= 90:
-                        buckets['61-90 days'].append(entry)
-                    else:
-                        buckets['90+ days'].append(entry)
+                    bucket_lists[min((days_overdue - 1) // 30, 3)].append(entry)
                 except:
                     continue
 
             # Build output
-            total_overdue = sum(sum(e['balance'] for e in entries) for entries in buckets.values())
+            total_overdue = sum(e['balance'] for entries in bucket_lists for e in entries)
 
             output = [
                 f"--- Overdue Aging Report ---",
@@ -113,12 +162,13 @@ def register_tools(mcp):
                 ""
             ]
 
-            for bucket_name, entries in buckets.items():
+            for bucket_name, entries in zip(bucket_names, bucket_lists):
                 if entries:
                     bucket_total = sum(e['balance'] for e in entries)
                     output.append(f"{bucket_name}: ${bucket_total:,.2f} ({len(entries)} invoices)")
-                    for e in entries[:5]:  # Show top 5 per bucket
-                        output.append(f"  - [{e['number']}] {e['client']}: ${e['balance']:,.2f} ({e['days']} days)")
+                    output.extend([  # Show top 5 per bucket
+                        f"  - [{e['number']}] {e['client']}: ${e['balance']:,.2f} ({e['days']} days)" for e in entries[:5]
+                    ])
                     if len(entries) > 5:
                         output.append(f"  ... and {len(entries) - 5} more")
                     output.append("")
@@ -141,49 +191,34 @@ def register_tools(mcp):
         Shows top clients by total paid amount.
         """
         try:
-            # Get payments with client info for date filtering
-            url = f"{NINJA_URL}/payments?status=active&per_page=500&include=client"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            payments = response.json().get('data', [])
+            payments = _payments(start_date, end_date)
 
-            # Filter by date and aggregate by client
-            client_revenue = {}
+            # Aggregate by client - totals keyed by id, names recorded once per client
+            totals = defaultdict(float)
+            names = {}
 
             for p in payments:
-                pay_date = p.get('date', '')
-
-                # Apply date filters
-                if start_date and pay_date < start_date:
-                    continue
-                if end_date and pay_date > end_date:
-                    continue
-
-                amount = float(p.get('amount', 0))
-                client = p.get('client', {})
+                client = p.get('client')
                 if not client:
                     continue
 
-                client_name = client.get('display_name', 'Unknown')
                 client_id = client.get('id', 'unknown')
+                totals[client_id] += float(p.get('amount', 0))
+                if client_id not in names:
+                    names[client_id] = client.get('display_name', 'Unknown')
 
-                if client_id not in client_revenue:
-                    client_revenue[client_id] = {'name': client_name, 'total': 0}
-                client_revenue[client_id]['total'] += amount
-
-            if not client_revenue:
+            if not totals:
                 return "No revenue recorded in the specified period."
 
             # Sort by revenue descending
-            sorted_clients = sorted(client_revenue.items(), key=lambda x: x[1]['total'], reverse=True)
+            sorted_clients = sorted(totals.items(), key=itemgetter(1), reverse=True)
 
-            total_revenue = sum(c[1]['total'] for c in sorted_clients)
+            total_revenue = sum(totals.values())
 
             output = [f"--- Revenue by Client ---"]
 
             if start_date or end_date:
-                date_range = f"{start_date or 'beginning'} to {end_date or 'now'}"
-                output.append(f"Date Range: {date_range}")
+                output.append(f"Date Range: {start_date or 'beginning'} to {end_date or 'now'}")
 
             output.extend([
                 f"Total Revenue: ${total_revenue:,.2f}",
@@ -192,9 +227,9 @@ def register_tools(mcp):
                 f"Top {min(limit, len(sorted_clients))} Clients:"
             ])
 
-            for client_id, data in sorted_clients[:limit]:
-                percent = (data['total'] / total_revenue * 100) if total_revenue > 0 else 0
-                output.append(f"- {data['name']}: ${data['total']:,.2f} ({percent:.1f}%)")
+            for client_id, total in sorted_clients[:limit]:
+                percent = (total / total_revenue * 100) if total_revenue > 0 else 0
+                output.append(f"- {names[client_id]}: ${total:,.2f} ({percent:.1f}%)")
 
             return "\n".join(output)
         except Exception as e:
@@ -213,66 +248,47 @@ def register_tools(mcp):
         - group_by: 'client' or 'month'
         """
         try:
-            from datetime import datetime
-
-            url = f"{NINJA_URL}/payments?status=active&per_page=500&include=client"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            payments = response.json().get('data', [])
+            payments = _payments(start_date, end_date)
 
-            # Filter by date
-            filtered = []
+            # Total and group in one pass over the payments
+            by_month = defaultdict(float)
+            by_client = defaultdict(float)
+            total_revenue = 0
+            count = 0
             for p in payments:
                 pay_date = p.get('date', '')
-                if start_date and pay_date < start_date:
-                    continue
-                if end_date and pay_date > end_date:
-                    continue
-                filtered.append(p)
+                amount = float(p.get('amount', 0))
+                total_revenue += amount
+                count += 1
+                if group_by == "month":
+                    if pay_date:
+                        month_key = pay_date[:7]  # YYYY-MM
+                        by_month[month_key] += amount
+                else:
+                    client_name = (p.get('client') or {}).get('display_name', 'Unknown')
+                    by_client[client_name] += amount
 
-            if not filtered:
+            if not count:
                 return "No payments found in the specified period."
 
-            total_revenue = sum(float(p.get('amount', 0)) for p in filtered)
-
             output = [f"--- Revenue Report ---"]
 
             if start_date or end_date:
-                date_range = f"{start_date or 'beginning'} to {end_date or 'now'}"
-                output.append(f"Date Range: {date_range}")
+                output.append(f"Date Range: {start_date or 'beginning'} to {end_date or 'now'}")
 
             output.extend([
                 f"Total Revenue: ${total_revenue:,.2f}",
-                f"Number of Payments: {len(filtered)}",
+                f"Number of Payments: {count}",
                 ""
             ])
 
             if group_by == "month":
-                # Group by month
-                by_month = {}
-                for p in filtered:
-                    pay_date = p.get('date', '')
-                    if pay_date:
-                        month_key = pay_date[:7]  # YYYY-MM
-                        if month_key not in by_month:
-                            by_month[month_key] = 0
-                        by_month[month_key] += float(p.get('amount', 0))
-
                 output.append("By Month:")
                 for month in sorted(by_month.keys(), reverse=True):
                     output.append(f"  {month}: ${by_month[month]:,.2f}")
 
             else:
-                # Group by client
-                by_client = {}
-                for p in filtered:
-                    client = p.get('client', {})
-                    client_name = client.get('display_name', 'Unknown') if client else 'Unknown'
-                    if client_name not in by_client:
-                        by_client[client_name] = 0
-                    by_client[client_name] += float(p.get('amount', 0))
-
-                sorted_clients = sorted(by_client.items(), key=lambda x: x[1], reverse=True)
+                sorted_clients = sorted(by_client.items(), key=itemgetter(1), reverse=True)
 
                 output.append("By Client:")
                 for name, amount in sorted_clients[:15]:
@@ -293,21 +309,12 @@ def register_tools(mcp):
         Compares total revenue against total expenses.
         """
         try:
-            # Get revenue from clients
-            clients_resp = requests.get(f"{NINJA_URL}/clients?status=active&per_page=500", headers=HEADERS)
-            clients_resp.raise_for_status()
-            clients = clients_resp.json().get('data', [])
+            # Client balances and expense total are independent - fetch them together
+            clients, total_expenses = parallel(active_clients, _expense_total)
 
             total_revenue = sum(float(c.get('paid_to_date', 0)) for c in clients)
             total_outstanding = sum(float(c.get('balance', 0)) for c in clients)
 
-            # Get expenses
-            expenses_resp = requests.get(f"{NINJA_URL}/expenses?status=active&per_page=500", headers=HEADERS)
-            expenses_resp.raise_for_status()
-            expenses = expenses_resp.json().get('data', [])
-
-            total_expenses = sum(float(e.get('amount', 0)) for e in expenses)
-
             # Calculate profit
             profit = total_revenue - total_expenses
             margin = (profit / total_revenue * 100) if total_revenue > 0 else 0
@@ -339,45 +346,16 @@ def register_tools(mcp):
         Quick snapshot of your freelance business health.
         """
         try:
-            # Gather all data
-            clients_resp = requests.get(f"{NINJA_URL}/clients?status=active", headers=HEADERS)
-            clients_resp.raise_for_status()
-            clients = clients_resp.json().get('data', [])
-
-            invoices_resp = requests.get(f"{NINJA_URL}/invoices?status=active&client_status=overdue&per_page=100", headers=HEADERS)
-            invoices_resp.raise_for_status()
-            overdue_invoices = invoices_resp.json().get('data', [])
-
-            expenses_resp = requests.get(f"{NINJA_URL}/expenses?status=active&per_page=500", headers=HEADERS)
-            expenses_resp.raise_for_status()
-            expenses = expenses_resp.json().get('data', [])
-
-            projects_resp = requests.get(f"{NINJA_URL}/projects?status=active", headers=HEADERS)
-            projects_resp.raise_for_status()
-            projects = projects_resp.json().get('data', [])
-
-            tasks_resp = requests.get(f"{NINJA_URL}/tasks?status=active", headers=HEADERS)
-            tasks_resp.raise_for_status()
-            tasks = tasks_resp.json().get('data', [])
+            clients, overdue_invoices, total_expenses, projects, tasks = _dashboard_data()
 
             # Calculate metrics
             total_revenue = sum(float(c.get('paid_to_date', 0)) for c in clients)
             total_outstanding = sum(float(c.get('balance', 0)) for c in clients)
             total_overdue = sum(float(inv.get('balance', 0)) for inv in overdue_invoices)
-            total_expenses = sum(float(e.get('amount', 0)) for e in expenses)
             profit = total_revenue - total_expenses
 
             # Count running tasks
-            import json
-            running_tasks = 0
-            for t in tasks:
-                time_log = t.get('time_log', '[]')
-                try:
-                    logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-                    if logs and len(logs[-1]) == 1:
-                        running_tasks += 1
-                except:
-                    pass
+            running_tasks = sum(1 for t in tasks if is_running(t.get('time_log')))
 
             output = [
                 f"=== BUSINESS DASHBOARD ===",
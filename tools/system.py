@@ -1,5 +1,5 @@
-import requests
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT
+from .cache import active_clients
 
 
 def register_tools(mcp):
@@ -9,16 +9,19 @@ def register_tools(mcp):
     def get_system_summary() -> str:
         """Get a high-level summary of total outstanding balances from the client list."""
         try:
-            response = requests.get(f"{NINJA_URL}/clients?status=active", headers=HEADERS)
-            response.raise_for_status()
-            clients = response.json().get('data', [])
+            # Invoice Ninja has no aggregate balance endpoint, so sum the full client
+            # list and count the rows summed, keeping count and totals in step
+            clients = active_clients()
+            client_count = len(clients)
 
-            total_outstanding = sum(float(c.get('balance', 0)) for c in clients)
-            total_revenue = sum(float(c.get('paid_to_date', 0)) for c in clients)
+            total_outstanding = total_revenue = 0.0
+            for c in clients:
+                total_outstanding += float(c.get('balance', 0))
+                total_revenue += float(c.get('paid_to_date', 0))
 
             return (
                 f"Financial Snapshot:\n"
-                f"- Active Clients: {len(clients)}\n"
+                f"- Active Clients: {client_count}\n"
                 f"- Total Outstanding: ${total_outstanding:,.2f}\n"
                 f"- Total Revenue: ${total_revenue:,.2f}"
             )
@@ -29,7 +32,7 @@ def register_tools(mcp):
     def ping() -> str:
         """Simple health check to verify connectivity to Invoice Ninja."""
         try:
-            response = requests.get(f"{NINJA_URL}/ping", headers=HEADERS)
+            response = SESSION.get(f"{NINJA_URL}/ping", timeout=TIMEOUT)
             if response.status_code == 200:
                 return "Successfully connected to Invoice Ninja!"
             else:
@@ -1,8 +1,100 @@
-import requests
-import json
+import heapq
 import time
+from email.utils import parsedate_to_datetime
+from functools import partial
+from operator import itemgetter
 from typing import Optional
-from .config import NINJA_URL, HEADERS
+from .config import NINJA_URL, SESSION, TIMEOUT, dumps, iter_rows, parallel, parse_json
+from .cache import cached_get, invalidate, TTL_TASKS
+from .timelog import is_running, parse, spans, task_time
+
+# How recent (by the server's clock) a timer entry must be to count as the one
+# this request just opened or closed - covers the request's own processing time
+_CLOCK_SLACK = 5
+
+
+def _server_time(response):
+    """The server's clock at response time from its Date header (local time if it has none)."""
+    try:
+        return int(parsedate_to_datetime(response.headers["Date"]).timestamp())
+    except (KeyError, TypeError, ValueError):
+        return int(time.time())
+
+
+def _timer_action(task_id, action):
+    """
+    Start or stop a task's timer in one request. Invoice Ninja applies
+    ?start=true / ?stop=true to the stored time_log itself, so there is no
+    GET-modify-PUT cycle. Returns (response, last time_log entry or None on
+    failure, server time of the response).
+    """
+    response = SESSION.put(f"{NINJA_URL}/tasks/{task_id}", params={action: "true"}, json={}, timeout=TIMEOUT)
+    if response.status_code != 200:
+        return response, None, None
+    logs = parse(parse_json(response).get('data', {}).get('time_log'))
+    return response, (logs[-1] if logs else []), _server_time(response)
+
+
+def _fmt_task(t, now):
+    """One list line for a task - each nested lookup is done once."""
+    client = (t.get('client') or {}).get('display_name', 'No Client')
+    project = (t.get('project') or {}).get('name', 'No Project')
+    hours, is_running = task_time(t, now)
+    status_icon = "RUNNING" if is_running else "stopped"
+    return f"- [{status_icon}] {t.get('description', 'No description')[:50]} (ID: {t.get('id')}) | {client} / {project} | {hours:.2f}h"
+
+
+def _task_details(task_id):
+    """Detail block for one task; errors are reported in place so a batch still returns the others."""
+    try:
+        params = {"include": "client,project"}
+        t = cached_get(f"/tasks/{task_id}", params, ttl=TTL_TASKS).get('data', {})
+
+        if not t:
+            return f"Task {task_id} not found."
+
+        description = t.get('description', 'No description')
+        client = (t.get('client') or {}).get('display_name', 'No Client')
+        project = (t.get('project') or {}).get('name', 'No Project')
+        rate = t.get('rate', 0)
+
+        # Parse time logs
+        try:
+            total_seconds = 0
+            is_running = False
+            log_details = []
+
+            for i, (seconds, running) in enumerate(spans(t.get('time_log'), int(time.time()))):
+                total_seconds += seconds
+                is_running = is_running or running
+                log_details.append(f"  Entry {i+1}: {seconds / 3600:.2f}h")
+
+            hours = total_seconds / 3600
+        except (ValueError, TypeError, IndexError):
+            hours = 0
+            is_running = False
+            log_details = []
+
+        status = "RUNNING" if is_running else "Stopped"
+        billable = hours * float(rate) if rate else 0
+
+        output = (
+            f"Task: {description}\n"
+            f"- ID: {task_id}\n"
+            f"- Client: {client}\n"
+            f"- Project: {project}\n"
+            f"- Status: {status}\n"
+            f"- Total Time: {hours:.2f}h\n"
+            f"- Rate: ${rate}/hr\n"
+            f"- Billable Amount: ${billable:.2f}"
+        )
+
+        if log_details:
+            output += "\n- Time Entries:\n" + "\n".join(log_details)
+
+        return output
+    except Exception as e:
+        return f"Error fetching task {task_id}: {str(e)}"
 
 
 def register_tools(mcp):
@@ -24,118 +116,36 @@ def register_tools(mcp):
         """
         try:
             entity_status = "active" if not include_archived else "active,archived,deleted"
-            url = f"{NINJA_URL}/tasks?status={entity_status}&per_page={limit}&include=client,project"
+            params = {"status": entity_status, "per_page": limit, "include": "client,project"}
 
             if client_id:
-                url += f"&client_id={client_id}"
+                params["client_id"] = client_id
             if project_id:
-                url += f"&project_id={project_id}"
+                params["project_id"] = project_id
 
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            tasks = response.json().get('data', [])
+            tasks = cached_get("/tasks", params, ttl=TTL_TASKS).get('data', [])
 
             if not tasks:
                 return "No tasks found."
 
-            output = [f"--- Found {len(tasks)} Tasks ---"]
-            for t in tasks:
-                task_id = t.get('id')
-                description = t.get('description', 'No description')[:50]
-                client = t.get('client', {}).get('display_name', 'No Client') if t.get('client') else 'No Client'
-                project = t.get('project', {}).get('name', 'No Project') if t.get('project') else 'No Project'
-
-                # Calculate total time from time_log
-                time_log = t.get('time_log', '[]')
-                try:
-                    logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-                    total_seconds = 0
-                    is_running = False
-                    for log in logs:
-                        start = log[0] if len(log) > 0 else 0
-                        end = log[1] if len(log) > 1 and log[1] else 0
-                        if end == 0 and start > 0:
-                            is_running = True
-                            end = int(time.time())
-                        if start and end:
-                            total_seconds += (end - start)
-                    hours = total_seconds / 3600
-                except:
-                    hours = 0
-                    is_running = False
-
-                status_icon = "RUNNING" if is_running else "stopped"
-                output.append(f"- [{status_icon}] {description} (ID: {task_id}) | {client} / {project} | {hours:.2f}h")
-
-            return "\n".join(output)
+            now = int(time.time())
+            header = f"--- Found {len(tasks)} Tasks ---"
+            return header + "\n" + "\n".join(_fmt_task(t, now) for t in tasks)
         except Exception as e:
             return f"Error fetching tasks: {str(e)}"
 
     @mcp.tool()
-    def get_task_details(task_id: str) -> str:
-        """Get detailed information about a specific task including time logs."""
-        try:
-            url = f"{NINJA_URL}/tasks/{task_id}?include=client,project"
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            t = response.json().get('data', {})
-
-            if not t:
-                return f"Task {task_id} not found."
-
-            description = t.get('description', 'No description')
-            client = t.get('client', {}).get('display_name', 'No Client') if t.get('client') else 'No Client'
-            project = t.get('project', {}).get('name', 'No Project') if t.get('project') else 'No Project'
-            rate = t.get('rate', 0)
-
-            # Parse time logs
-            time_log = t.get('time_log', '[]')
-            try:
-                logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-                total_seconds = 0
-                is_running = False
-                log_details = []
-
-                for i, log in enumerate(logs):
-                    start = log[0] if len(log) > 0 else 0
-                    end = log[1] if len(log) > 1 and log[1] else 0
-
-                    if end == 0 and start > 0:
-                        is_running = True
-                        end = int(time.time())
-
-                    if start and end:
-                        duration = end - start
-                        total_seconds += duration
-                        hours = duration / 3600
-                        log_details.append(f"  Entry {i+1}: {hours:.2f}h")
-
-                hours = total_seconds / 3600
-            except:
-                hours = 0
-                is_running = False
-                log_details = []
-
-            status = "RUNNING" if is_running else "Stopped"
-            billable = hours * float(rate) if rate else 0
-
-            output = (
-                f"Task: {description}\n"
-                f"- ID: {task_id}\n"
-                f"- Client: {client}\n"
-                f"- Project: {project}\n"
-                f"- Status: {status}\n"
-                f"- Total Time: {hours:.2f}h\n"
-                f"- Rate: ${rate}/hr\n"
-                f"- Billable Amount: ${billable:.2f}"
-            )
-
-            if log_details:
-                output += "\n- Time Entries:\n" + "\n".join(log_details)
-
-            return output
-        except Exception as e:
-            return f"Error: {str(e)}"
+    def get_task_details(task_id: list[str] | str) -> str:
+        """
+        Get detailed information about a task including time logs.
+        - task_id: A task ID, or a list of IDs to look up several tasks at once
+        """
+        if isinstance(task_id, str):
+            return _task_details(task_id)
+
+        # Independent reads - fetch them side by side over the pooled session
+        details = parallel(*(partial(_task_details, tid) for tid in task_id))
+        return "\n\n".join(details) if details else "No task IDs given."
 
     @mcp.tool()
     def create_task(
@@ -164,10 +174,11 @@ def register_tools(mcp):
             if rate:
                 payload["rate"] = rate
 
-            response = requests.post(f"{NINJA_URL}/tasks", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.post(f"{NINJA_URL}/tasks", json=payload, timeout=TIMEOUT)
 
             if response.status_code in [200, 201]:
-                task = response.json().get('data', {})
+                invalidate("/tasks")
+                task = parse_json(response).get('data', {})
                 return f"Success! Created task '{description}' (ID: {task.get('id')})"
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -178,33 +189,17 @@ def register_tools(mcp):
     def start_task(task_id: str) -> str:
         """Start the timer on a task. Adds a new time entry with current timestamp."""
         try:
-            # First get current task to preserve existing time logs
-            response = requests.get(f"{NINJA_URL}/tasks/{task_id}", headers=HEADERS)
-            response.raise_for_status()
-            task = response.json().get('data', {})
-
-            time_log = task.get('time_log', '[]')
-            try:
-                logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-            except:
-                logs = []
-
-            # Check if already running
-            if logs and len(logs[-1]) == 1:
-                return f"Task {task_id} is already running."
-
-            # Add new time entry with start time
-            current_time = int(time.time())
-            logs.append([current_time])
-
-            # Update task
-            payload = {"time_log": json.dumps(logs)}
-            response = requests.put(f"{NINJA_URL}/tasks/{task_id}", headers=HEADERS, json=payload, timeout=10)
+            response, last, server_now = _timer_action(task_id, "start")
+            if last is None:
+                return f"Failed: {response.status_code} - {response.text}"
+            invalidate("/tasks")
 
-            if response.status_code == 200:
+            running = is_running([last])
+            if running and last[0] >= server_now - _CLOCK_SLACK:
                 return f"Started timer on task {task_id}."
-            else:
-                return f"Failed: {response.status_code} - {response.text}"
+            if running:
+                return f"Task {task_id} is already running."
+            return f"Could not start timer on task {task_id} (it may already be invoiced)."
         except Exception as e:
             return f"Error: {str(e)}"
 
@@ -212,38 +207,19 @@ def register_tools(mcp):
     def stop_task(task_id: str) -> str:
         """Stop the timer on a running task. Completes the current time entry."""
         try:
-            # Get current task
-            response = requests.get(f"{NINJA_URL}/tasks/{task_id}", headers=HEADERS)
-            response.raise_for_status()
-            task = response.json().get('data', {})
-
-            time_log = task.get('time_log', '[]')
-            try:
-                logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-            except:
-                logs = []
+            response, last, server_now = _timer_action(task_id, "stop")
+            if last is None:
+                return f"Failed: {response.status_code} - {response.text}"
+            invalidate("/tasks")
 
-            # Check if running (last entry has only start time)
-            if not logs or len(logs[-1]) != 1:
+            # Only an entry the server closed just now counts - an older end means nothing was running
+            if len(last) < 2 or not last[1] or last[1] < server_now - _CLOCK_SLACK:
                 return f"Task {task_id} is not currently running."
 
-            # Add end time to last entry
-            current_time = int(time.time())
-            logs[-1].append(current_time)
-
-            # Calculate duration of this session
-            start_time = logs[-1][0]
-            duration_seconds = current_time - start_time
-            duration_hours = duration_seconds / 3600
-
-            # Update task
-            payload = {"time_log": json.dumps(logs)}
-            response = requests.put(f"{NINJA_URL}/tasks/{task_id}", headers=HEADERS, json=payload, timeout=10)
-
-            if response.status_code == 200:
-                return f"Stopped timer on task {task_id}. Session duration: {duration_hours:.2f}h"
-            else:
-                return f"Failed: {response.status_code} - {response.text}"
+            # Logged hours roll up into the project's current_hours
+            invalidate("/projects")
+            duration_hours = (last[1] - last[0]) / 3600
+            return f"Stopped timer on task {task_id}. Session duration: {duration_hours:.2f}h"
         except Exception as e:
             return f"Error: {str(e)}"
 
@@ -261,15 +237,13 @@ def register_tools(mcp):
         """
         try:
             # Get current task
-            response = requests.get(f"{NINJA_URL}/tasks/{task_id}", headers=HEADERS)
+            response = SESSION.get(f"{NINJA_URL}/tasks/{task_id}", timeout=TIMEOUT)
             response.raise_for_status()
-            task = response.json().get('data', {})
+            task = parse_json(response).get('data', {})
 
-            time_log = task.get('time_log', '[]')
-            try:
-                logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-            except:
-                logs = []
+            # A log that will not decode is an error, not an empty log - writing
+            # it back as [] would wipe the task's recorded time
+            logs = parse(task.get('time_log'))
 
             # Create a time entry for the specified hours (ending now)
             current_time = int(time.time())
@@ -279,15 +253,17 @@ def register_tools(mcp):
             logs.append([start_time, current_time])
 
             # Update task
-            payload = {"time_log": json.dumps(logs)}
+            payload = {"time_log": dumps(logs)}
             if description:
                 # Append to existing description
                 existing_desc = task.get('description', '')
                 payload["description"] = f"{existing_desc}\n[{hours}h] {description}".strip()
 
-            response = requests.put(f"{NINJA_URL}/tasks/{task_id}", headers=HEADERS, json=payload, timeout=10)
+            response = SESSION.put(f"{NINJA_URL}/tasks/{task_id}", json=payload, timeout=TIMEOUT)
 
             if response.status_code == 200:
+                invalidate("/tasks")
+                invalidate("/projects")
                 return f"Logged {hours}h to task {task_id}."
             else:
                 return f"Failed: {response.status_code} - {response.text}"
@@ -297,59 +273,50 @@ def register_tools(mcp):
     @mcp.tool()
     def get_billable_hours(
         client_id: Optional[str] = None,
-        project_id: Optional[str] = None
+        project_id: Optional[str] = None,
+        top_n: int = 10
     ) -> str:
         """
         Get summary of unbilled hours across tasks.
         Optionally filter by client or project.
+        - top_n: How many tasks to list, largest hours first (totals always cover every task)
         """
         try:
-            url = f"{NINJA_URL}/tasks?status=active&per_page=100&include=client,project"
+            # Ask the API to drop invoiced tasks up front; the invoice_id check
+            # below still guards servers that ignore the filter
+            params = {"status": "active", "client_status": "uninvoiced"}
 
             if client_id:
-                url += f"&client_id={client_id}"
+                params["client_id"] = client_id
             if project_id:
-                url += f"&project_id={project_id}"
+                params["project_id"] = project_id
 
-            response = requests.get(url, headers=HEADERS)
-            response.raise_for_status()
-            tasks = response.json().get('data', [])
-
-            if not tasks:
-                return "No tasks found."
-
-            # Filter for uninvoiced tasks and calculate hours
+            # Filter for uninvoiced tasks and calculate hours - every page is
+            # covered, the next one downloading while this one is summed
             total_hours = 0
             total_billable = 0
-            task_summaries = []
+            task_rows = []
+            task_count = 0
+            now = int(time.time())
 
-            for t in tasks:
+            for t in iter_rows("/tasks", params):
+                task_count += 1
                 # Skip if already invoiced
                 if t.get('invoice_id'):
                     continue
 
-                time_log = t.get('time_log', '[]')
                 rate = float(t.get('rate', 0))
-
-                try:
-                    logs = json.loads(time_log) if isinstance(time_log, str) else time_log
-                    task_seconds = 0
-                    for log in logs:
-                        start = log[0] if len(log) > 0 else 0
-                        end = log[1] if len(log) > 1 and log[1] else int(time.time())
-                        if start and end:
-                            task_seconds += (end - start)
-                    task_hours = task_seconds / 3600
-                except:
-                    task_hours = 0
+                task_hours, _ = task_time(t, now)
 
                 if task_hours > 0:
                     total_hours += task_hours
                     billable = task_hours * rate
                     total_billable += billable
 
-                    desc = t.get('description', 'No description')[:30]
-                    task_summaries.append(f"- {desc}: {task_hours:.2f}h (${billable:.2f})")
+                    task_rows.append((task_hours, billable, t.get('description', 'No description')[:30]))
+
+            if not task_count:
+                return "No tasks found."
 
             output = [
                 f"--- Unbilled Hours Summary ---",
@@ -358,10 +325,12 @@ def register_tools(mcp):
                 f"",
                 f"Tasks:"
             ]
-            output.extend(task_summaries[:10])  # Show top 10
+            # Only the shown rows are ordered and formatted
+            top = heapq.nlargest(top_n, task_rows, key=itemgetter(0))
+            output.extend([f"- {desc}: {task_hours:.2f}h (${billable:.2f})" for task_hours, billable, desc in top])
 
-            if len(task_summaries) > 10:
-                output.append(f"... and {len(task_summaries) - 10} more tasks")
+            if len(task_rows) > len(top):
+                output.append(f"... and {len(task_rows) - len(top)} more tasks")
 
             return "\n".join(output)
         except Exception as e:
@@ -0,0 +1,63 @@
+from .config import loads
+
+
+def parse(time_log):
+    """
+    Decode a task's time_log. The API sends it as a JSON string of entries
+    like [[start, end], [start, end, "notes", billable], [start]] in Unix
+    seconds; a running timer's last entry has no end (or an end of 0).
+    """
+    if isinstance(time_log, (str, bytes)):
+        return loads(time_log or "[]")
+    return time_log or []
+
+
+def spans(time_log, now):
+    """Yield (seconds, running) for each timed entry, measuring a running entry up to `now`."""
+    for log in parse(time_log):
+        start = log[0] if log else 0
+        end = log[1] if len(log) > 1 and log[1] else 0
+        running = end == 0 and start > 0
+        if running:
+            end = now
+        if start and end:
+            yield end - start, running
+
+
+def task_time(task, now):
+    """Return (hours logged, timer running) for a task, counting a running entry up to `now`."""
+    try:
+        total_seconds = 0
+        is_running = False
+        for seconds, running in spans(task.get('time_log'), now):
+            total_seconds += seconds
+            is_running = is_running or running
+        return total_seconds / 3600, is_running
+    except (ValueError, TypeError, IndexError):
+        # Malformed time_log - count it as no time rather than failing the whole tool
+        return 0, False
+
+
+def is_running(time_log):
+    """
+    True if the task's timer is running. Only the last entry is looked at, and
+    plain numeric entries are read straight off the string without decoding
+    the whole log; entries carrying notes fall back to a full parse.
+    """
+    if isinstance(time_log, str):
+        raw = time_log.rstrip()
+        if raw.endswith("]]"):
+            last = raw[raw.rfind("[") + 1:-2]
+            if '"' not in last:
+                fields = [f.strip() for f in last.split(",")]
+                end = fields[1] if len(fields) > 1 else ""
+                return fields[0] not in ("", "0") and end in ("", "0", "null")
+        elif not raw.strip("[] "):
+            return False
+
+    try:
+        logs = parse(time_log)
+        last = logs[-1] if logs else []
+        return bool(last) and bool(last[0]) and not (len(last) > 1 and last[1])
+    except (ValueError, TypeError, IndexError):
+        return False